@@ -0,0 +1,87 @@
+"""
+Splits page text into overlapping, paragraph-aligned chunks for drug extraction.
+"""
+import re
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n|\n')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+# Cheap signals that a chunk may mention a drug the lexicon does not know yet. Words like
+# "dose" or "medication" appear in nearly every chunk of a drug page, so they do not count.
+DOSE_PATTERN = re.compile(r'\b\d+(\.\d+)?\s?(mg|mcg|µg|ml|iu|units?)\b', re.IGNORECASE)
+# Generic-name stems, anchored to whole words of seven letters or more ("lisinopril", not "April").
+DRUG_STEMS = re.compile(
+    r'\b(?=[a-z]{7,}\b)[a-z]{2,}(pril|olol|sartan|statin|cillin|mycin|cycline|floxacin|conazole|prazole|tidine'
+    r'|dipine|azepam|azolam|umab|ximab|tinib|triptan|oxetine|codone|adone)\b',
+    re.IGNORECASE,
+)
+
+
+def _pieces(text, max_chars):
+    """Paragraphs, with any paragraph longer than max_chars split by sentence and then hard-wrapped."""
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            yield paragraph
+            continue
+        for sentence in SENTENCE_BREAK.split(paragraph):
+            for start in range(0, len(sentence), max_chars):
+                yield sentence[start:start + max_chars]
+
+
+def iter_chunks(text, max_chars=4000, overlap=200):
+    """
+    Yields chunks of at most max_chars (plus overlap) built from whole paragraphs. Each chunk
+    after the first starts with the last `overlap` characters of the previous one, so a
+    name split across a boundary is still seen whole by one of them.
+    """
+    current = []
+    size = 0
+    tail = ''
+    for piece in _pieces(text, max_chars):
+        if current and size + len(piece) + 1 > max_chars:
+            chunk = '\n'.join(current)
+            yield (tail + '\n' + chunk) if tail else chunk
+            tail = chunk[-overlap:] if overlap else ''
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        chunk = '\n'.join(current)
+        yield (tail + '\n' + chunk) if tail else chunk
+
+
+def candidate_hints(chunk, scanner):
+    """
+    Signs that a chunk mentions a drug the lexicon does not know: drug-name stems the
+    scanner cannot normalize, or a dose in a chunk with no lexicon hit to account for it.
+    """
+    hints = {m.group(0).lower() for m in DRUG_STEMS.finditer(chunk) if scanner.normalize(m.group(0)) is None}
+    if not hints and not scanner.scan(chunk):
+        dose = DOSE_PATTERN.search(chunk)
+        if dose:
+            hints.add(dose.group(0).lower())
+    return hints
+
+
+def select_chunks(chunks, scanner, max_chunks, max_chars):
+    """
+    Picks the chunks worth sending to the agent, in page order: those with a hint no earlier
+    chunk already covers, up to max_chunks and a total of max_chars (the first is always
+    allowed). Returns (selected, dropped), where dropped counts chunks cut by the limits.
+    """
+    selected, seen = [], set()
+    size = dropped = 0
+    for chunk in chunks:
+        hints = candidate_hints(chunk, scanner) - seen
+        if not hints:
+            continue
+        if len(selected) >= max_chunks or (selected and size + len(chunk) > max_chars):
+            dropped += 1
+            continue
+        selected.append(chunk)
+        seen |= hints
+        size += len(chunk)
+    return selected, dropped
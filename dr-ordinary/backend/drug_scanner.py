@@ -0,0 +1,202 @@
+"""
+Aho-Corasick drug-name scanner.
+
+Every generic and brand name in the lexicon is compiled into one automaton, so a page
+is scanned in a single linear pass regardless of lexicon size. Matches must sit on word
+boundaries, and brand names are reported under their generic name.
+"""
+import csv
+import hashlib
+import json
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Generic name -> brand names. Used when no lexicon file is configured. Manufacturer names
+# (e.g. Bayer) are left out: they appear on pages that are not about the drug.
+DEFAULT_LEXICON = {
+    'ibuprofen': ['advil', 'motrin', 'nuprin'],
+    'acetaminophen': ['tylenol', 'panadol', 'paracetamol'],
+    'aspirin': ['bufferin', 'ecotrin'],
+    'warfarin': ['coumadin', 'jantoven'],
+    'metformin': ['glucophage', 'fortamet', 'glumetza'],
+    'lisinopril': ['prinivil', 'zestril'],
+    'amlodipine': ['norvasc'],
+    'atorvastatin': ['lipitor'],
+    'levothyroxine': ['synthroid', 'levoxyl'],
+    'omeprazole': ['prilosec'],
+    'metoprolol': ['lopressor', 'toprol'],
+    'losartan': ['cozaar'],
+    'gabapentin': ['neurontin'],
+    'sertraline': ['zoloft'],
+    'trazodone': ['desyrel'],
+    'prednisone': ['deltasone'],
+    'tramadol': ['ultram'],
+    'hydrocodone': ['hysingla'],
+    'oxycodone': ['oxycontin', 'roxicodone'],
+    'amoxicillin': ['amoxil'],
+    'azithromycin': ['zithromax'],
+    'ciprofloxacin': ['cipro'],
+    'doxycycline': ['vibramycin'],
+    'penicillin': [],
+}
+
+
+def load_lexicon(path: str) -> Dict[str, List[str]]:
+    """
+    Reads a lexicon file: either JSON ({"generic": ["brand", ...]}) or CSV with
+    `generic` and `brand` columns (one row per brand; a blank brand lists the generic alone).
+    """
+    if path.endswith('.csv'):
+        lexicon: Dict[str, List[str]] = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                generic = row['generic'].strip().lower()
+                brands = lexicon.setdefault(generic, [])
+                brand = (row.get('brand') or '').strip().lower()
+                if brand:
+                    brands.append(brand)
+        return lexicon
+    with open(path, encoding='utf-8') as f:
+        return {generic.lower(): [b.lower() for b in brands] for generic, brands in json.load(f).items()}
+
+
+def _is_word_char(ch: str) -> bool:
+    # A hyphen joins a compound name ("amoxicillin-penicillin"), so it is not a boundary.
+    return ch.isalnum() or ch == '-'
+
+
+class DrugScanner:
+    """A compiled Aho-Corasick automaton over every name in a lexicon."""
+
+    def __init__(self, lexicon: Dict[str, Iterable[str]]):
+        # Each term maps to the generic name it should be reported as.
+        self.terms: List[str] = []
+        self.generic_for: List[str] = []
+        for generic, brands in lexicon.items():
+            for term in [generic, *brands]:
+                term = term.strip().lower()
+                if term:
+                    self.terms.append(term)
+                    self.generic_for.append(generic.strip().lower())
+        self.fingerprint = self.lexicon_fingerprint(lexicon)
+        self._build()
+
+    @staticmethod
+    def lexicon_fingerprint(lexicon: Dict[str, Iterable[str]]) -> str:
+        canonical = json.dumps({g: sorted(b) for g, b in lexicon.items()}, sort_keys=True)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _build(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+
+        for index, term in enumerate(self.terms):
+            state = 0
+            for ch in term:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nxt
+            self.output[state].append(index)
+
+        # Breadth-first pass to set failure links and inherit outputs along them.
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def scan(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """
+        Returns every whole-word match as (start, end, matched term, generic name),
+        ordered by position.
+        """
+        lowered = text.lower()
+        matches = []
+        state = 0
+        for i, ch in enumerate(lowered):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for index in self.output[state]:
+                term = self.terms[index]
+                start, end = i - len(term) + 1, i + 1
+                if start > 0 and _is_word_char(lowered[start - 1]):
+                    continue
+                if end < len(lowered) and _is_word_char(lowered[end]):
+                    continue
+                matches.append((start, end, term, self.generic_for[index]))
+        matches.sort()
+        return matches
+
+    def detect(self, text: str) -> List[str]:
+        """Unique generic names mentioned in the text, in order of first mention."""
+        return list(dict.fromkeys(generic for _, _, _, generic in self.scan(text)))
+
+    def normalize(self, name: str) -> Optional[str]:
+        """Maps a single brand or generic name to its generic name, if it is in the lexicon."""
+        matches = [m for m in self.scan(name.strip()) if m[0] == 0 and m[1] == len(name.strip())]
+        return matches[0][3] if matches else None
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'fingerprint': self.fingerprint,
+            'terms': self.terms,
+            'generic_for': self.generic_for,
+            'goto': self.goto,
+            'fail': self.fail,
+            'output': self.output,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> 'DrugScanner':
+        """Restores an automaton written by to_dict without rebuilding it."""
+        scanner = cls.__new__(cls)
+        scanner.fingerprint = str(data['fingerprint'])
+        scanner.terms = [str(t) for t in data['terms']]
+        scanner.generic_for = [str(g) for g in data['generic_for']]
+        scanner.goto = [{str(ch): int(nxt) for ch, nxt in edges.items()} for edges in data['goto']]
+        scanner.fail = [int(f) for f in data['fail']]
+        scanner.output = [[int(i) for i in out] for out in data['output']]
+        if not (len(scanner.goto) == len(scanner.fail) == len(scanner.output)
+                and len(scanner.terms) == len(scanner.generic_for)):
+            raise ValueError('inconsistent automaton tables')
+        return scanner
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load_or_build(cls, lexicon: Dict[str, Iterable[str]], cache_path: Optional[str] = None) -> 'DrugScanner':
+        """
+        Loads a previously serialized (JSON) automaton from `cache_path` if it was built
+        from the same lexicon; otherwise builds a new one and writes it there.
+        """
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, encoding='utf-8') as f:
+                    scanner = cls.from_dict(json.load(f))
+                if scanner.fingerprint == cls.lexicon_fingerprint(lexicon):
+                    return scanner
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"[WARN] Could not load drug scanner from {cache_path}: {e}")
+
+        scanner = cls(lexicon)
+        if cache_path:
+            try:
+                scanner.save(cache_path)
+            except OSError as e:
+                print(f"[WARN] Could not save drug scanner to {cache_path}: {e}")
+        return scanner
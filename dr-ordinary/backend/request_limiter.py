@@ -0,0 +1,83 @@
+"""
+Bounded in-flight limiter with a waiting queue and latency stats for the Flask backend.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class QueueFullError(Exception):
+    """Raised when both the in-flight slots and the waiting queue are full."""
+
+
+class RequestLimiter:
+    """
+    Lets at most `max_in_flight` requests do work at once. Up to `max_queue` more wait
+    (for at most `queue_timeout` seconds) for a slot; anything beyond that is rejected
+    so a burst of tabs cannot pile up unbounded threads behind a slow Letta call.
+    """
+
+    def __init__(self, max_in_flight=8, max_queue=32, queue_timeout=30.0, window=500):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._latencies = deque(maxlen=window)
+        self._waits = deque(maxlen=window)
+        self.counters = {'completed': 0, 'rejected': 0, 'timed_out': 0}
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self.counters['rejected'] += 1
+                raise QueueFullError('Too many queued requests')
+            self._waiting += 1
+
+        queued_at = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self.counters['timed_out'] += 1
+                raise QueueFullError('Timed out waiting for a free worker')
+            self._in_flight += 1
+            self._waits.append(time.perf_counter() - queued_at)
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._in_flight -= 1
+                self._latencies.append(elapsed)
+                self.counters['completed'] += 1
+            self._slots.release()
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 4)
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            waits = list(self._waits)
+            return {
+                'in_flight': self._in_flight,
+                'queue_depth': self._waiting,
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                **self.counters,
+                'latency_p50': self._percentile(latencies, 50),
+                'latency_p95': self._percentile(latencies, 95),
+                'queue_wait_p50': self._percentile(waits, 50),
+                'queue_wait_p95': self._percentile(waits, 95),
+            }
@@ -0,0 +1,91 @@
+"""
+Content-hash cache for /analyze results: an LRU with TTL and an optional SQLite tier.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(url, content):
+    """Hash of the URL plus the whitespace-normalized content that gets analyzed."""
+    normalized = ' '.join(content.split())
+    digest = hashlib.sha256()
+    digest.update(url.strip().encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalized.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def etag_for(key):
+    return f'"{key[:32]}"'
+
+
+class AnalysisCache:
+    """
+    Entries are keyed by their ETag so a conditional request can be answered from the
+    If-None-Match header alone, without the client re-sending the page text.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, path=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS analyses (etag TEXT PRIMARY KEY, created_at REAL NOT NULL, result TEXT NOT NULL)'
+            )
+            self._db.commit()
+
+    def _fresh(self, created_at):
+        return not self.ttl_seconds or time.time() - created_at <= self.ttl_seconds
+
+    def get(self, etag):
+        """Returns the cached result for an ETag, or None."""
+        with self._lock:
+            entry = self._memory.get(etag)
+            if entry and self._fresh(entry[0]):
+                self._memory.move_to_end(etag)
+                return entry[1]
+            self._memory.pop(etag, None)
+
+            if self._db is not None:
+                row = self._db.execute('SELECT created_at, result FROM analyses WHERE etag = ?', (etag,)).fetchone()
+                if row and self._fresh(row[0]):
+                    result = json.loads(row[1])
+                    self._store_memory(etag, row[0], result)
+                    return result
+                if row:
+                    self._db.execute('DELETE FROM analyses WHERE etag = ?', (etag,))
+                    self._db.commit()
+            return None
+
+    def _store_memory(self, etag, created_at, result):
+        self._memory[etag] = (created_at, result)
+        self._memory.move_to_end(etag)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def set(self, etag, result):
+        created_at = time.time()
+        with self._lock:
+            self._store_memory(etag, created_at, result)
+            if self._db is not None:
+                self._db.execute('INSERT OR REPLACE INTO analyses (etag, created_at, result) VALUES (?, ?, ?)',
+                                 (etag, created_at, json.dumps(result)))
+                self._db.commit()
+
+    def record(self, outcome):
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, 'entries': len(self._memory), 'disk': self._db is not None}
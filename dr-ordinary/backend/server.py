@@ -1,19 +1,71 @@
 import os
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from requests.adapters import HTTPAdapter
+
+from chunker import iter_chunks, select_chunks
+from drug_scanner import DEFAULT_LEXICON, DrugScanner, load_lexicon
+from request_limiter import QueueFullError, RequestLimiter
+from result_cache import AnalysisCache, content_key, etag_for
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for Chrome extension
+CORS(app, expose_headers=['ETag'])  # Enable CORS for Chrome extension
 
 # === CONFIG ===
 AGENT_ID = os.getenv("LETTA_AGENT_ID", "agent-432881a4-890f-41d3-8c19-373edbe8770e")
 LETTA_API_KEY = os.getenv("LETTA_API_KEY", "your_letta_api_key_here")
+LETTA_BASE_URL = os.getenv("LETTA_BASE_URL", "https://api.letta.com").rstrip("/")
+DRUG_LEXICON_PATH = os.getenv("DRUG_LEXICON_PATH")
+DRUG_SCANNER_CACHE = os.getenv("DRUG_SCANNER_CACHE")
+LETTA_ENRICHMENT = os.getenv("LETTA_ENRICHMENT", "1") != "0"
+LETTA_CONNECT_TIMEOUT = float(os.getenv("LETTA_CONNECT_TIMEOUT", 5))
+LETTA_READ_TIMEOUT = float(os.getenv("LETTA_READ_TIMEOUT", 30))
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", 8))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", 32))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", 30))
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 4000))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
+MAX_CHUNKS = int(os.getenv("MAX_CHUNKS", 16))
+# Total characters of page text sent to Letta per analysis, across all chunks.
+MAX_LETTA_CHARS = int(os.getenv("MAX_LETTA_CHARS", 8000))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", 16))
+
+# One pooled, keep-alive HTTP session for every outbound Letta call.
+letta_session = requests.Session()
+letta_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=max(MAX_IN_FLIGHT, CHUNK_WORKERS)))
+letta_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=max(MAX_IN_FLIGHT, CHUNK_WORKERS)))
+
+# Bounds the total number of concurrent chunk extractions across all requests.
+chunk_executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="chunk")
+
+limiter = RequestLimiter(max_in_flight=MAX_IN_FLIGHT, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT)
+
+analysis_cache = AnalysisCache(
+    max_entries=int(os.getenv("ANALYZE_CACHE_SIZE", 1024)),
+    ttl_seconds=float(os.getenv("ANALYZE_CACHE_TTL", 3600)),
+    path=os.getenv("ANALYZE_CACHE_PATH"),
+)
+
+# Built once at startup (or loaded from DRUG_SCANNER_CACHE) and shared by every request.
+drug_scanner = DrugScanner.load_or_build(
+    load_lexicon(DRUG_LEXICON_PATH) if DRUG_LEXICON_PATH else DEFAULT_LEXICON,
+    DRUG_SCANNER_CACHE,
+)
 
 # === FUNCTION ===
+def assistant_content(data):
+    """The last assistant_message in a Letta /messages response, or an OpenAI-style choice."""
+    for msg in reversed(data.get("messages") or []):
+        if isinstance(msg, dict) and msg.get("message_type") == "assistant_message":
+            return msg.get("content")
+    choices = data.get("choices") or [{}]
+    return choices[0].get("message", {}).get("content")
+
 def extract_drugs(message: str):
-    url = f"https://api.letta.com/v1/agents/{AGENT_ID}/messages"
+    url = f"{LETTA_BASE_URL}/v1/agents/{AGENT_ID}/messages"
     headers = {
         "Authorization": f"Bearer {LETTA_API_KEY}",
         "Content-Type": "application/json"
@@ -28,15 +80,18 @@ def extract_drugs(message: str):
     }
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = letta_session.post(url, headers=headers, json=payload,
+                                      timeout=(LETTA_CONNECT_TIMEOUT, LETTA_READ_TIMEOUT))
 
         if response.status_code != 200:
             print(f"[ERROR {response.status_code}] {response.text}")
             return None
 
         data = response.json()
-        # Adjust this if your agent returns under a different key
-        content = data.get("choices", [{}])[0].get("message", {}).get("content")
+        content = assistant_content(data)
+        if content is None:
+            print(f"[ERROR] No assistant message in Letta response: {data}")
+            return []
         
         # Try to parse the content as JSON
         try:
@@ -50,25 +105,80 @@ def extract_drugs(message: str):
             print(f"[ERROR] Failed to parse JSON from content: {content}")
             return []
             
+    except requests.Timeout:
+        print(f"[ERROR] Letta API timed out after {LETTA_READ_TIMEOUT}s")
+        return None
     except Exception as e:
         print(f"[ERROR] Failed to call Letta API: {e}")
         return None
 
 @app.route('/analyze', methods=['POST'])
 def analyze_content():
+    # ETag and cache checks run before taking a limiter slot: only cache misses should
+    # wait behind slow Letta calls or be turned away with a 503.
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         content = data.get('content', '')
         url = data.get('url', '')
-        
+        if_none_match = request.headers.get('If-None-Match')
+
         if not content:
+            # Conditional request without a body: the ETag alone identifies the page.
+            if if_none_match and analysis_cache.get(if_none_match) is not None:
+                analysis_cache.record('not_modified')
+                return '', 304, {'ETag': if_none_match}
+            if if_none_match:
+                return jsonify({'error': 'Unknown ETag, resend the request with content'}), 412
             return jsonify({'error': 'No content provided'}), 400
+
+        etag = etag_for(content_key(url, content))
+        cached = cached_response(etag, if_none_match)
+        if cached is not None:
+            return cached
+    except Exception as e:
+        print(f"[ERROR] Server error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    try:
+        with limiter.slot():
+            return _analyze(content, url, etag, if_none_match)
+    except QueueFullError as e:
+        return jsonify({'error': str(e), 'queue_depth': limiter.stats()['queue_depth']}), 503, {'Retry-After': '2'}
+
+def cached_response(etag, if_none_match):
+    """A 304 or cached 200 for the page, or None on a cache miss."""
+    cached = analysis_cache.get(etag)
+    if cached is None:
+        return None
+    if if_none_match == etag:
+        analysis_cache.record('not_modified')
+        return '', 304, {'ETag': etag}
+    analysis_cache.record('hits')
+    return jsonify({**cached, 'cache': 'hit'}), 200, {'ETag': etag}
+
+def _analyze(content, url, etag, if_none_match):
+    try:
+        # Another request may have analyzed the same page while this one waited for a slot.
+        cached = cached_response(etag, if_none_match)
+        if cached is not None:
+            return cached
+
+        analysis_cache.record('misses')
+        result, complete = detect_drugs(content, url)
+        # Results missing their Letta enrichment are not cached, so the next view retries it.
+        if complete:
+            analysis_cache.set(etag, result)
+        return jsonify({**result, 'cache': 'miss'}), 200, {'ETag': etag}
         
-        # Create the message for Letta
-        message = f"""Analyze this webpage content and identify any drug names mentioned.
+    except Exception as e:
+        print(f"[ERROR] Server error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def chunk_message(url, chunk):
+    return f"""Analyze this webpage content and identify any drug names mentioned.
 
 URL: {url}
-Content: {content[:8000]}
+Content: {chunk}
 
 Please identify all drug names (generic and brand names) mentioned in the content.
 
@@ -78,42 +188,59 @@ Respond with ONLY a JSON array of drug names, like this:
 If no drugs are found, respond with an empty array: []
 
 Do not include any other text, just the JSON array."""
-        
-        # Extract drugs using Letta
-        drugs = extract_drugs(message)
-        
-        if drugs is None:
-            # Fallback to basic keyword detection
-            drugs = fallback_drug_detection(content)
-        
-        return jsonify({'drugs': drugs})
-        
-    except Exception as e:
-        print(f"[ERROR] Server error: {e}")
-        return jsonify({'error': str(e)}), 500
 
-def fallback_drug_detection(content):
-    """Fallback drug detection using keyword matching"""
-    drug_keywords = [
-        'advil', 'ibuprofen', 'tylenol', 'acetaminophen', 'aspirin', 'warfarin',
-        'metformin', 'lisinopril', 'amlodipine', 'atorvastatin', 'levothyroxine',
-        'omeprazole', 'metoprolol', 'losartan', 'gabapentin', 'sertraline',
-        'trazodone', 'prednisone', 'tramadol', 'hydrocodone', 'oxycodone',
-        'amoxicillin', 'azithromycin', 'ciprofloxacin', 'doxycycline', 'penicillin'
-    ]
+def detect_drugs(content, url):
+    """
+    Runs local detection over the whole page plus optional Letta enrichment of the chunks
+    that look like they mention drugs. Returns (result, complete).
+    """
+    # The local scanner is the primary detector; Letta only adds names it does not know.
+    drugs = drug_scanner.detect(content)
+    if not LETTA_ENRICHMENT:
+        return {'drugs': drugs, 'sources': ['local']}, True
+    
+    chunks = list(iter_chunks(content, max_chars=CHUNK_SIZE, overlap=CHUNK_OVERLAP))
+    candidates, dropped = select_chunks(chunks, drug_scanner, MAX_CHUNKS, MAX_LETTA_CHARS)
+    chunk_stats = {'total': len(chunks), 'sent': len(candidates), 'dropped': dropped}
+    if not candidates:
+        return {'drugs': drugs, 'sources': ['local'], 'chunks': chunk_stats}, True
+    
+    # Enrich with Letta, one call per candidate chunk on the shared worker pool
+    results = list(chunk_executor.map(extract_drugs, [chunk_message(url, chunk) for chunk in candidates]))
+    complete = all(r is not None for r in results)
     
-    content_lower = content.lower()
-    found_drugs = [drug for drug in drug_keywords if drug in content_lower]
-    return found_drugs
+    for letta_drugs in results:
+        for name in letta_drugs or []:
+            if isinstance(name, str) and name.strip():
+                drugs.append(drug_scanner.normalize(name) or name.strip().lower())
+    
+    sources = ['local', 'letta'] if any(r is not None for r in results) else ['local']
+    return {'drugs': list(dict.fromkeys(drugs)), 'sources': sources, 'chunks': chunk_stats}, complete
+
+def fallback_drug_detection(content):
+    """Fallback drug detection using the local lexicon scanner"""
+    return drug_scanner.detect(content)
 
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'agent_id': AGENT_ID})
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({**limiter.stats(), 'cache': analysis_cache.stats()})
+
 if __name__ == "__main__":
     print(f"Starting Dr. Ordinary backend server...")
-    print(f"Agent ID: {AGENT_ID}")
+    print(f"Agent ID: {AGENT_ID} at {LETTA_BASE_URL}")
+    print(f"Drug lexicon: {len(drug_scanner.terms)} names ({DRUG_LEXICON_PATH or 'built-in'})")
     print(f"API Key: {'Set' if LETTA_API_KEY != 'your_letta_api_key_here' else 'Not set'}")
     print(f"Server will run on http://localhost:5000")
+    print(f"Concurrency: {MAX_IN_FLIGHT} in flight, {MAX_QUEUE} queued")
     
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    try:
+        # Prefer a production WSGI server with a worker thread pool when it is installed.
+        from waitress import serve
+        serve(app, host='0.0.0.0', port=5000, threads=MAX_IN_FLIGHT + MAX_QUEUE)
+    except ImportError:
+        print("[WARN] waitress is not installed (pip install waitress); using Flask's development server")
+        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True) 
\ No newline at end of file
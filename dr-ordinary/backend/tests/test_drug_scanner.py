@@ -0,0 +1,19 @@
+from drug_scanner import DEFAULT_LEXICON, DrugScanner
+
+scanner = DrugScanner(DEFAULT_LEXICON)
+
+
+def test_hyphenated_compound_is_not_split_into_lexicon_hits():
+    assert scanner.detect("Take amoxicillin-penicillin as directed.") == []
+
+
+def test_names_inside_longer_words_are_not_reported():
+    assert scanner.detect("Amoxicillins and penicillinase are not drugs here.") == []
+
+
+def test_brands_are_reported_as_generics():
+    assert scanner.detect("Advil, then Coumadin; ibuprofen again.") == ["ibuprofen", "warfarin"]
+
+
+def test_manufacturer_names_are_not_drugs():
+    assert scanner.detect("Bayer Leverkusen won the match.") == []
@@ -0,0 +1,198 @@
+"""
+Central admission control for outbound Letta requests: a token bucket for the request
+rate, a cap on concurrent requests, strict priority between traffic classes, round-robin
+fairness between requests of the same class, and multiplicative backoff on 429s.
+
+The traffic class is carried in a context variable, so it follows a request into every
+pipeline task it spawns without being passed through each call. Endpoints, batch workers
+and background jobs tag themselves with set_call_class(); anything untagged counts as
+interactive.
+"""
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+PRIORITIES = ("interactive", "batch", "background")
+
+_call_class: ContextVar[Tuple[str, str]] = ContextVar("agent_call_class", default=("interactive", "default"))
+_flow_ids = itertools.count(1)
+
+
+def set_call_class(priority: str, flow: Optional[str] = None):
+    """Tags agent calls made from the current task (and tasks it starts) with a class and flow."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}")
+    _call_class.set((priority, flow or f"{priority}-{next(_flow_ids)}"))
+
+
+def current_call_class() -> Tuple[str, str]:
+    return _call_class.get()
+
+
+class AgentScheduler:
+    def __init__(self, rate: float = 5.0, burst: int = 10, max_concurrency: int = 16,
+                 min_rate: float = 0.2, recovery: float = 0.05, window: int = 500):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.in_flight_by_priority: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self.paused_until = 0.0
+        self._refilled_at = time.monotonic()
+        # priority -> flow -> waiting futures; flows are served round-robin.
+        self._queues: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._waits: Dict[str, Deque[float]] = {p: deque(maxlen=window) for p in PRIORITIES}
+        self.counters = {"granted": 0, "rate_limited": 0}
+
+    @classmethod
+    def from_env(cls) -> "AgentScheduler":
+        """Reads LETTA_RATE (requests/sec, 0 for unlimited), LETTA_BURST and LETTA_MAX_CONCURRENCY."""
+        return cls(
+            rate=float(os.getenv("LETTA_RATE", 5)),
+            burst=int(os.getenv("LETTA_BURST", 10)),
+            max_concurrency=int(os.getenv("LETTA_MAX_CONCURRENCY", 16)),
+        )
+
+    # --- Token bucket ---
+
+    def _refill(self, now: float):
+        if self.base_rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _has_token(self) -> bool:
+        return self.base_rate <= 0 or self.tokens >= 1
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        """The next live waiter: highest priority first, round-robin across flows within it."""
+        for priority in PRIORITIES:
+            flows = self._queues[priority]
+            while flows:
+                flow, waiters = next(iter(flows.items()))
+                while waiters and waiters[0].done():
+                    waiters.popleft()
+                if not waiters:
+                    del flows[flow]
+                    continue
+                waiter = waiters.popleft()
+                flows.move_to_end(flow)
+                if not waiters:
+                    del flows[flow]
+                return waiter
+        return None
+
+    def _dispatch(self):
+        self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self.in_flight < self.max_concurrency and now >= self.paused_until and self._has_token():
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if self.base_rate > 0:
+                self.tokens -= 1
+            self.in_flight += 1
+            waiter.set_result(None)
+
+        if self.in_flight < self.max_concurrency and any(self._queues.values()):
+            # Blocked on the pause or on tokens, not on concurrency: wake up when that clears.
+            delay = max(self.paused_until - now, 0.0)
+            if not self._has_token():
+                delay = max(delay, (1 - self.tokens) / self.rate)
+            self._schedule(delay)
+
+    def _schedule(self, delay: float):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    # --- Admission ---
+
+    @asynccontextmanager
+    async def slot(self, agent_type: str = "") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Waits for permission to send one request and holds a concurrency slot until the
+        block exits. Yields a ticket with the call's priority, flow and queue wait.
+        """
+        priority, flow = current_call_class()
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(flow, deque()).append(waiter)
+        queued_at = time.monotonic()
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we were cancelled: hand the slot back.
+                self._release()
+            raise
+
+        wait = time.monotonic() - queued_at
+        self._waits[priority].append(wait)
+        self.counters["granted"] += 1
+        self.in_flight_by_priority[priority] += 1
+        try:
+            yield {"agent": agent_type, "priority": priority, "flow": flow, "queue_wait": wait}
+        finally:
+            self.in_flight_by_priority[priority] -= 1
+            self._release()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    # --- Adaptive rate ---
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Halves the send rate and, if Letta said how long, holds every class until then."""
+        self.counters["rate_limited"] += 1
+        if self.base_rate > 0:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+        if retry_after:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def on_success(self):
+        """Additively recovers the send rate towards the configured rate."""
+        if self.base_rate > 0 and self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * self.recovery)
+
+    # --- Status ---
+
+    def queued(self, priority: str) -> int:
+        return sum(1 for waiters in self._queues[priority].values() for w in waiters if not w.done())
+
+    def active(self, priority: str) -> int:
+        """Agent requests of a class that are running or waiting for admission."""
+        return self.in_flight_by_priority[priority] + self.queued(priority)
+
+    @staticmethod
+    def _percentile(values, pct: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 4)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate": self.rate,
+            "configured_rate": self.base_rate,
+            "tokens": round(self.tokens, 2),
+            "in_flight": self.in_flight,
+            "in_flight_by_priority": dict(self.in_flight_by_priority),
+            "max_concurrency": self.max_concurrency,
+            "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            **self.counters,
+            "queued": {p: sum(len(w) for w in flows.values()) for p, flows in self._queues.items()},
+            "queue_wait_p50": {p: self._percentile(w, 50) for p, w in self._waits.items()},
+            "queue_wait_p95": {p: self._percentile(w, 95) for p, w in self._waits.items()},
+        }
@@ -0,0 +1,255 @@
+"""
+Pluggable drug stores: a small in-memory store for the built-in drugs and a SQLite-backed
+store for full formularies that materializes DrugInfo records lazily on lookup.
+"""
+import csv
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class DrugInfo:
+    """A simple container for drug information."""
+    name: str
+    smiles: str
+    targets: List[str]
+    pathways: List[str]
+    properties: Dict[str, Any]
+
+
+class DrugRecord:
+    """
+    Compact row form of a drug. Lists become tuples and properties stay serialized until
+    the record is turned into a DrugInfo, so large formularies stay cheap to hold.
+    """
+    __slots__ = ("name", "smiles", "targets", "pathways", "properties_json", "brand_names")
+
+    def __init__(self, name: str, smiles: str, targets: Iterable[str], pathways: Iterable[str],
+                 properties_json: str = "{}", brand_names: Iterable[str] = ()):
+        self.name = name
+        self.smiles = smiles
+        self.targets = tuple(targets)
+        self.pathways = tuple(pathways)
+        self.properties_json = properties_json
+        self.brand_names = tuple(brand_names)
+
+    @classmethod
+    def from_drug_info(cls, drug: DrugInfo, brand_names: Iterable[str] = ()) -> "DrugRecord":
+        return cls(drug.name, drug.smiles, drug.targets, drug.pathways,
+                   json.dumps(drug.properties, sort_keys=True), brand_names)
+
+    def to_drug_info(self) -> DrugInfo:
+        return DrugInfo(
+            name=self.name,
+            smiles=self.smiles,
+            targets=list(self.targets),
+            pathways=list(self.pathways),
+            properties=json.loads(self.properties_json),
+        )
+
+
+def _key(name: str) -> str:
+    return name.strip().lower()
+
+
+class DrugStore(ABC):
+    """
+    Lookup interface shared by every store. Names are matched case-insensitively against
+    both generic and brand names; `get` returns None for unknown drugs.
+    """
+
+    @abstractmethod
+    def get(self, name: str) -> Optional[DrugInfo]:
+        ...
+
+    @abstractmethod
+    def add(self, drug: DrugInfo, brand_names: Iterable[str] = ()):
+        ...
+
+    @abstractmethod
+    def iter_drugs(self) -> Iterator[DrugInfo]:
+        """Streams every drug once, without populating any lookup cache."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __getitem__(self, name: str) -> DrugInfo:
+        drug = self.get(name)
+        if drug is None:
+            raise KeyError(name)
+        return drug
+
+    def resolve(self, *names: str) -> Tuple[List[DrugInfo], List[str]]:
+        """Looks up several names at once, returning (found drugs, names that were not found)."""
+        found, missing = [], []
+        for name in names:
+            drug = self.get(name)
+            if drug is None:
+                missing.append(_key(name))
+            else:
+                found.append(drug)
+        return found, missing
+
+
+class InMemoryDrugStore(DrugStore):
+    """Wraps a dict of DrugInfo keyed by lowercase generic name, plus a brand-name alias map."""
+
+    def __init__(self, drugs: Optional[Dict[str, DrugInfo]] = None,
+                 brand_names: Optional[Dict[str, Iterable[str]]] = None):
+        self._drugs: Dict[str, DrugInfo] = {}
+        self._aliases: Dict[str, str] = {}
+        brand_names = brand_names or {}
+        for key, drug in (drugs or {}).items():
+            self.add(drug, brand_names.get(key, ()))
+
+    def get(self, name: str) -> Optional[DrugInfo]:
+        key = _key(name)
+        return self._drugs.get(self._aliases.get(key, key))
+
+    def add(self, drug: DrugInfo, brand_names: Iterable[str] = ()):
+        key = _key(drug.name)
+        self._drugs[key] = drug
+        for brand in brand_names:
+            self._aliases[_key(brand)] = key
+
+    def iter_drugs(self) -> Iterator[DrugInfo]:
+        return iter(list(self._drugs.values()))
+
+    def __len__(self) -> int:
+        return len(self._drugs)
+
+
+class SQLiteDrugStore(DrugStore):
+    """
+    A formulary in an indexed SQLite file. Nothing is loaded at startup; each lookup is an
+    indexed query over the alias table, and the most recently used drugs are kept in a
+    small LRU of materialized DrugInfo objects.
+    """
+
+    def __init__(self, path: str, cache_size: int = 1024):
+        self.path = path
+        self.cache_size = cache_size
+        self._hot: "OrderedDict[str, Optional[DrugInfo]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS drugs (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                smiles TEXT NOT NULL,
+                targets TEXT NOT NULL,
+                pathways TEXT NOT NULL,
+                properties TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS aliases (
+                alias TEXT PRIMARY KEY,
+                drug_id INTEGER NOT NULL REFERENCES drugs (id),
+                is_brand INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS aliases_drug_id ON aliases (drug_id);
+            """
+        )
+        self._db.commit()
+
+    def _row_to_record(self, row: Tuple) -> DrugRecord:
+        name, smiles, targets, pathways, properties = row
+        return DrugRecord(name, smiles, json.loads(targets), json.loads(pathways), properties)
+
+    def get(self, name: str) -> Optional[DrugInfo]:
+        key = _key(name)
+        with self._lock:
+            if key in self._hot:
+                self._hot.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._hot[key]
+
+            self.stats["misses"] += 1
+            row = self._db.execute(
+                """SELECT d.name, d.smiles, d.targets, d.pathways, d.properties
+                   FROM aliases a JOIN drugs d ON d.id = a.drug_id WHERE a.alias = ?""",
+                (key,),
+            ).fetchone()
+            drug = self._row_to_record(row).to_drug_info() if row else None
+
+            # Misses are remembered too, so repeated lookups of unknown names stay cheap.
+            self._hot[key] = drug
+            while len(self._hot) > self.cache_size:
+                self._hot.popitem(last=False)
+            return drug
+
+    def add(self, drug: DrugInfo, brand_names: Iterable[str] = ()):
+        self.add_many([DrugRecord.from_drug_info(drug, brand_names)])
+
+    def add_many(self, records: Iterable[DrugRecord]) -> int:
+        """Inserts or replaces records in one transaction. Returns how many were written."""
+        count = 0
+        with self._lock, self._db:
+            for record in records:
+                key = _key(record.name)
+                existing = self._db.execute(
+                    "SELECT drug_id FROM aliases WHERE alias = ? AND is_brand = 0", (key,)
+                ).fetchone()
+                values = (record.name, record.smiles, json.dumps(list(record.targets)),
+                          json.dumps(list(record.pathways)), record.properties_json)
+                if existing:
+                    drug_id = existing[0]
+                    for (alias,) in self._db.execute("SELECT alias FROM aliases WHERE drug_id = ?", (drug_id,)).fetchall():
+                        self._hot.pop(alias, None)
+                    self._db.execute(
+                        "UPDATE drugs SET name = ?, smiles = ?, targets = ?, pathways = ?, properties = ? WHERE id = ?",
+                        values + (drug_id,),
+                    )
+                else:
+                    drug_id = self._db.execute(
+                        "INSERT INTO drugs (name, smiles, targets, pathways, properties) VALUES (?, ?, ?, ?, ?)", values
+                    ).lastrowid
+                self._db.execute("INSERT OR REPLACE INTO aliases (alias, drug_id, is_brand) VALUES (?, ?, 0)", (key, drug_id))
+                for brand in record.brand_names:
+                    self._db.execute("INSERT OR REPLACE INTO aliases (alias, drug_id, is_brand) VALUES (?, ?, 1)",
+                                     (_key(brand), drug_id))
+                    self._hot.pop(_key(brand), None)
+                self._hot.pop(key, None)
+                count += 1
+        return count
+
+    def import_file(self, path: str) -> int:
+        """
+        Loads a formulary from a JSON list or a CSV file. Each entry needs name and smiles;
+        targets, pathways and brand_names are lists (semicolon-separated in CSV) and
+        properties is an object (a JSON string in CSV).
+        """
+        def records() -> Iterator[DrugRecord]:
+            if path.endswith(".csv"):
+                with open(path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        split = lambda v: [x.strip() for x in (v or "").split(";") if x.strip()]
+                        yield DrugRecord(row["name"], row["smiles"], split(row.get("targets")),
+                                         split(row.get("pathways")), row.get("properties") or "{}",
+                                         split(row.get("brand_names")))
+            else:
+                with open(path, encoding="utf-8") as f:
+                    for entry in json.load(f):
+                        yield DrugRecord(entry["name"], entry["smiles"], entry.get("targets", []),
+                                         entry.get("pathways", []), json.dumps(entry.get("properties", {})),
+                                         entry.get("brand_names", []))
+
+        return self.add_many(records())
+
+    def iter_drugs(self) -> Iterator[DrugInfo]:
+        cursor = self._db.execute("SELECT name, smiles, targets, pathways, properties FROM drugs ORDER BY id")
+        for row in cursor:
+            yield self._row_to_record(row).to_drug_info()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM drugs").fetchone()[0]
@@ -1,35 +1,67 @@
 import asyncio
+import hmac
+import itertools
 import json
+import logging
 import os
 import re
-from dataclasses import dataclass, asdict
-from typing import Dict, Any, List
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Dict, Any, AsyncIterator, Awaitable, List, Literal, Optional, Set, Tuple
 
 import aiohttp
 from dotenv import load_dotenv
 
 # FastAPI and Pydantic
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
 
-# --- Data Structures ---
+from agent_scheduler import AgentScheduler, set_call_class
+from drug_store import DrugInfo, DrugStore, InMemoryDrugStore, SQLiteDrugStore
+from job_queue import JobQueue
+from known_interactions import KnownInteraction, KnownInteractionIndex
+from letta_pool import LettaConnectionPool
+from metrics import (AGENT_ERRORS, AGENT_LATENCY, AGENTS_IN_FLIGHT, FALLBACKS, NODE_LATENCY, PARSE_FAILURES,
+                     PIPELINES_CANCELLED, PIPELINES_IN_FLIGHT, PROMPT_BYTES, QUEUE_WAIT, RESPONSE_BYTES, STAGE_LATENCY,
+                     render as render_metrics, span, stage)
+from overlap_index import OverlapIndex
+from pipeline import NodeResult, PipelineNode, iter_pipeline
+from precompute import Precomputer
+from prediction_cache import PROMPT_VERSION, PredictionCache, make_cache_key
+from prompt_builder import PromptBuilder
+from resilience import (AgentCallError, ResiliencePolicy, current_deadline, hedged_call, parse_retry_after,
+                        remaining_budget, set_deadline)
+from similarity import SimilarityIndex
+from single_flight import SingleFlight
 
-@dataclass
-class DrugInfo:
-    """A simple container for drug information."""
-    name: str
-    smiles: str
-    targets: List[str]
-    pathways: List[str]
-    properties: Dict[str, Any]
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger("dr_strange")
 
 # --- Letta Agent System ---
 
+ANALYST_TYPES = ("chemical_analyst", "pathway_analyst", "target_analyst", "similarity_analyst")
+
+# "full" uses the presenter and risk-labeler agents; "batched" asks the presenter for every
+# summary and the risk label in one round trip; "fast" derives those fields locally.
+PIPELINE_MODES = ("full", "batched", "fast")
+
+# Section header in the batched presenter response, e.g. "## chemical_analyst".
+SECTION_HEADER = re.compile(r"^\s*#+\s*([a-z_]+)\s*:?\s*$", re.MULTILINE | re.IGNORECASE)
+RISK_LABELS = {"very high": "Very High", "high": "High", "moderate": "Moderate", "low": "Low",
+               "minimal": "Minimal", "none": "None"}
+
 class LettaDDIAgentSystem:
     """A system for orchestrating DDI prediction using multiple Letta agents."""
-    def __init__(self):
+    def __init__(self, drug_store: Optional[DrugStore] = None):
         load_dotenv()
         self.api_key = os.getenv("LETTA_API_KEY")
         if not self.api_key:
@@ -49,9 +81,68 @@ class LettaDDIAgentSystem:
             missing = [k for k, v in self.agent_ids.items() if not v]
             raise ValueError(f"Missing Letta agent ID(s) in environment variables: {', '.join(missing)}")
 
+        self.base_url = os.getenv("LETTA_BASE_URL", "https://api.letta.com").rstrip("/")
         self.session = None
+        self.cache = PredictionCache.from_env()
+        self.inflight = SingleFlight()
+        self.resilience = ResiliencePolicy.from_env()
+        # Every outbound agent request waits here for a rate token and a concurrency slot.
+        self.scheduler = AgentScheduler.from_env()
+        # Token budget for the JSON embedded in coordinator/presenter/labeler prompts; 0 disables it.
+        self.prompts = PromptBuilder(token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", 2000)))
+
+        def generic_name(name: str) -> str:
+            drug = drug_store.get(name) if drug_store is not None else None
+            return drug.name if drug is not None else name
+
+        # Curated interactions are answered without the agents; with KNOWN_DDI_ENRICH=1 the
+        # agents still run in the background and their analyses are cached alongside.
+        self.known_interactions = KnownInteractionIndex.from_env(generic_name)
+        self.enrich_known = os.getenv("KNOWN_DDI_ENRICH", "0") == "1"
+        self._enriching: Set[str] = set()
+        self._background: Set[asyncio.Task] = set()
+
+        # Local structural similarity: "context" feeds fingerprint results to the similarity
+        # analyst, "replace" skips that agent entirely, "off" restores the agent-only prompt.
+        self.local_similarity = os.getenv("LOCAL_SIMILARITY", "context").lower()
+        # Built by build_indexes() in the app's lifespan hook (or on first use), never at import.
+        self.drug_store = drug_store
+        self._overlap_index: Optional[OverlapIndex] = None
+        self._similarity_index: Optional[SimilarityIndex] = None
+        self._index_lock = threading.Lock()
+
+    def build_indexes(self):
+        """Builds the overlap and similarity indexes in one streaming pass over the store."""
+        with self._index_lock:
+            if self._overlap_index is not None:
+                return
+            started = time.perf_counter()
+            overlap = OverlapIndex()
+            names, smiles = [], []
+            for drug in (self.drug_store.iter_drugs() if self.drug_store is not None else ()):
+                overlap.add(drug.name, drug.targets, drug.pathways)
+                if drug.smiles:
+                    names.append(drug.name)
+                    smiles.append(drug.smiles)
+            self._similarity_index = SimilarityIndex(names, smiles)
+            self._overlap_index = overlap
+            logger.info("🗂️ Built local indexes over %d drugs in %.2fs", len(overlap.drug_targets),
+                        time.perf_counter() - started)
+
+    @property
+    def overlap_index(self) -> OverlapIndex:
+        if self._overlap_index is None:
+            self.build_indexes()
+        return self._overlap_index
+
+    @property
+    def similarity_index(self) -> SimilarityIndex:
+        if self._overlap_index is None:
+            self.build_indexes()
+        return self._similarity_index
 
     async def _get_session(self):
+        # Fallback for standalone use; the FastAPI app passes its pooled session explicitly.
         if self.session is None or self.session.closed:
             self.session = aiohttp.ClientSession()
         return self.session
@@ -63,112 +154,232 @@ class LettaDDIAgentSystem:
             return match.group(2).strip()
         return text.strip()
 
-    async def run_agent(self, agent_type: str, agent_id: str, prompt: str) -> Dict[str, Any]:
-        """Runs a single agent and returns its parsed JSON response."""
-        session = await self._get_session()
-        url = f"https://api.letta.com/v1/agents/{agent_id}/messages"
+    async def run_agent(self, agent_type: str, agent_id: str, prompt: str,
+                        session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
+        """
+        Runs a single agent and returns its parsed JSON response. 429s, 5xx responses and
+        timeouts are retried with jittered backoff, an attempt still running past the agent's
+        p95 latency is hedged with one duplicate, and an agent whose circuit is open fails
+        fast with an error so callers can fall back to local results.
+        """
+        PROMPT_BYTES.labels(agent_type).observe(len(prompt.encode("utf-8")))
+        with span("run_agent", agent=agent_type), AGENTS_IN_FLIGHT.labels(agent_type).track_inprogress(), \
+                AGENT_LATENCY.labels(agent_type).time():
+            return await self._call_agent(agent_type, agent_id, prompt, session)
+
+    async def _call_agent(self, agent_type: str, agent_id: str, prompt: str,
+                          session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
+        if session is None:
+            session = await self._get_session()
+        breaker = self.resilience.breaker(agent_type)
+        ticket = breaker.allow()
+        if ticket is None:
+            self.resilience.counters["short_circuited"] += 1
+            AGENT_ERRORS.labels(agent_type, "circuit_open").inc()
+            return {"error": f"Circuit open for {agent_type}; Letta is degraded", "circuit_open": True}
+
+        url = f"{self.base_url}/v1/agents/{agent_id}/messages"
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
         payload = {"messages": [{"role": "user", "content": prompt}]}
-        
-        try:
-            async with session.post(url, headers=headers, json=payload, timeout=90) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    print(f"Error from {agent_type} ({response.status}): {error_text}")
-                    return {"error": f"Agent API Error: {error_text}"}
-                
-                data = await response.json()
-
-                # The /messages endpoint returns a dict containing a 'messages' list.
-                if not isinstance(data, dict):
-                    print(f"ERROR ({agent_type}): Unexpected response format. Expected dict, got {type(data)}. Response: {data}")
-                    return {"error": f"Agent returned unexpected data format: {data}"}
-
-                messages_list = data.get("messages", [])
-                if not isinstance(messages_list, list):
-                    print(f"ERROR ({agent_type}): 'messages' key did not contain a list. Response: {data}")
-                    return {"error": f"Agent response missing 'messages' list: {data}"}
-                
-                assistant_message = next(
-                    (msg.get("content") for msg in reversed(messages_list) if isinstance(msg, dict) and msg.get("message_type") == "assistant_message"),
-                    None
-                )
-                
-                if not assistant_message:
-                    return {"error": "No assistant message found in response"}
-                
-                print(f"[DEBUG] Raw assistant message for {agent_type}: {assistant_message}")
-                
-                cleaned_message = self._clean_json_response(assistant_message)
-                
-                print(f"[DEBUG] Cleaned message for {agent_type}: {cleaned_message}")
-                
-                # Special handling for presenter agent - it returns raw text, which we wrap in a dict.
-                if agent_type == 'presenter':
-                    final_text = cleaned_message.split('\n')[0].strip()
-                    return {"summary": final_text}
-                
-                # Special handling for the new risk labeler agent.
-                if agent_type == 'risk_labeler':
-                    final_text = cleaned_message.split('\n')[0].strip()
-                    return {"risk_label": final_text}
-
-                # Special handling for target_analyst text response
-                if agent_type == 'target_analyst' and 'no shared' in cleaned_message.lower():
-                     print(f"[INFO] Target analyst reported no shared targets. Creating fallback JSON.")
-                     return {"shared_targets": [], "explanation": cleaned_message}
 
+        try:
+            for attempt in range(self.resilience.max_attempts):
+                # The hedge delay is a post-admission latency percentile, so its clock starts
+                # when the scheduler grants the primary a slot, not while it is queued.
+                admitted = asyncio.Event()
+                send = lambda: self._post_agent(agent_type, session, url, headers, payload, admitted)
                 try:
-                    return json.loads(cleaned_message)
-                except json.JSONDecodeError as json_error:
-                    print(f"[ERROR] JSON decode error for {agent_type}: {json_error}")
-                    print(f"[ERROR] Problematic JSON string: {repr(cleaned_message)}")
-                    return {"error": f"Failed to parse JSON response: {str(json_error)}"}
+                    data, hedge_won = await hedged_call(send, self.resilience.hedge_delay(agent_type), admitted)
+                except AgentCallError as e:
+                    logger.warning("Error processing %s (attempt %d): %s", agent_type, attempt + 1, e)
+                    error = e
+                    if not e.retryable or attempt + 1 == self.resilience.max_attempts:
+                        break
+                    delay = self.resilience.backoff(attempt, e.retry_after)
+                    budget = remaining_budget()
+                    if budget is not None and delay >= budget:
+                        # The retry could not finish before the request's deadline.
+                        break
+                    self.resilience.counters["retries"] += 1
+                    await asyncio.sleep(delay)
+                    continue
+                if hedge_won:
+                    self.resilience.counters["hedge_wins"] += 1
+                breaker.record_success(ticket)
+                return self._parse_agent_response(agent_type, data)
+
+            budget = remaining_budget()
+            if budget is not None and budget <= 0:
+                # Running out of request budget says nothing about Letta's health, so no
+                # failure is recorded; a half-open trial is still handed back below.
+                self.resilience.counters["deadline_exhausted"] += 1
+                breaker.release_trial(ticket)
+            else:
+                breaker.record_failure(ticket)
+            return {"error": str(error)}
+        finally:
+            # A half-open trial that was cancelled (client gone, pipeline cut short, work
+            # abandoned) recorded no outcome; without this the breaker would never probe again.
+            breaker.release_trial(ticket)
+
+    async def _post_agent(self, agent_type: str, session: aiohttp.ClientSession, url: str,
+                          headers: Dict[str, str], payload: Dict[str, Any],
+                          admitted: Optional[asyncio.Event] = None) -> Any:
+        """
+        One POST to the agent's /messages endpoint, sent once the scheduler admits it and
+        bounded by the agent's latency-derived timeout or the request's remaining budget,
+        whichever is shorter.
+        """
+        self.resilience.counters["attempts"] += 1
+        async with self.scheduler.slot(agent_type) as ticket:
+            if admitted is not None:
+                admitted.set()
+            QUEUE_WAIT.labels(agent_type, ticket["priority"]).observe(ticket["queue_wait"])
+            logger.debug("%s admitted after %.3fs in the %s queue", agent_type, ticket["queue_wait"], ticket["priority"])
+            timeout = self.resilience.timeout_for(agent_type)
+            budget = remaining_budget()
+            if budget is not None:
+                if budget <= 0:
+                    AGENT_ERRORS.labels(agent_type, "deadline").inc()
+                    raise AgentCallError(f"Deadline passed before {agent_type} was called")
+                timeout = min(timeout, budget)
+            started = time.perf_counter()
+            try:
+                async with session.post(url, headers=headers, json=payload,
+                                        timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        logger.warning("Error from %s (%s): %s", agent_type, response.status, error_text)
+                        AGENT_ERRORS.labels(agent_type, "http").inc()
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        if response.status == 429:
+                            self.scheduler.on_rate_limited(retry_after)
+                        raise AgentCallError(
+                            f"Agent API Error: {error_text}",
+                            status=response.status,
+                            retryable=response.status == 429 or response.status >= 500,
+                            retry_after=retry_after,
+                        )
+                    body = await response.read()
+            except asyncio.TimeoutError as e:
+                AGENT_ERRORS.labels(agent_type, "timeout").inc()
+                raise AgentCallError(f"{agent_type} timed out after {timeout:.1f}s", retryable=True) from e
+            except aiohttp.ClientError as e:
+                AGENT_ERRORS.labels(agent_type, "transport").inc()
+                raise AgentCallError(str(e), retryable=True) from e
+        self.scheduler.on_success()
+        RESPONSE_BYTES.labels(agent_type).observe(len(body))
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            PARSE_FAILURES.labels(agent_type, "invalid_body").inc()
+            raise AgentCallError(f"Agent returned a non-JSON body: {e}") from e
+        self.resilience.latency.record(agent_type, time.perf_counter() - started)
+        return data
+
+    def _parse_agent_response(self, agent_type: str, data: Any) -> Dict[str, Any]:
+        """Extracts the assistant message from a /messages response and parses it."""
+        # The /messages endpoint returns a dict containing a 'messages' list.
+        if not isinstance(data, dict):
+            logger.error("%s: unexpected response format, expected dict, got %s. Response: %s", agent_type, type(data), data)
+            PARSE_FAILURES.labels(agent_type, "format").inc()
+            return {"error": f"Agent returned unexpected data format: {data}"}
+
+        messages_list = data.get("messages", [])
+        if not isinstance(messages_list, list):
+            logger.error("%s: 'messages' key did not contain a list. Response: %s", agent_type, data)
+            PARSE_FAILURES.labels(agent_type, "messages").inc()
+            return {"error": f"Agent response missing 'messages' list: {data}"}
+        
+        assistant_message = next(
+            (msg.get("content") for msg in reversed(messages_list) if isinstance(msg, dict) and msg.get("message_type") == "assistant_message"),
+            None
+        )
+        
+        if not assistant_message:
+            PARSE_FAILURES.labels(agent_type, "no_assistant_message").inc()
+            return {"error": "No assistant message found in response"}
+        
+        logger.debug("Raw assistant message for %s: %s", agent_type, assistant_message)
+        
+        cleaned_message = self._clean_json_response(assistant_message)
+        
+        logger.debug("Cleaned message for %s: %s", agent_type, cleaned_message)
+        
+        # Special handling for presenter agent - it returns raw text, which we wrap in a dict.
+        if agent_type == 'presenter':
+            final_text = cleaned_message.split('\n')[0].strip()
+            return {"summary": final_text}
+        
+        # The batched presenter answers in "## section" blocks, parsed by the caller.
+        if agent_type == 'presenter_batch':
+            return {"text": cleaned_message}
 
-        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
-            print(f"Error processing {agent_type}: {e}")
-            return {"error": str(e)}
+        # Special handling for the new risk labeler agent.
+        if agent_type == 'risk_labeler':
+            final_text = cleaned_message.split('\n')[0].strip()
+            return {"risk_label": final_text}
 
-    async def get_risk_label_from_agent(self, analysis: Dict[str, Any]) -> str:
+        # Special handling for target_analyst text response
+        if agent_type == 'target_analyst' and 'no shared' in cleaned_message.lower():
+            logger.info("Target analyst reported no shared targets. Creating fallback JSON.")
+            return {"shared_targets": [], "explanation": cleaned_message}
+
+        try:
+            return json.loads(cleaned_message)
+        except json.JSONDecodeError as json_error:
+            logger.error("JSON decode error for %s: %s", agent_type, json_error)
+            logger.debug("Problematic JSON string: %r", cleaned_message)
+            PARSE_FAILURES.labels(agent_type, "json_decode").inc()
+            return {"error": f"Failed to parse JSON response: {str(json_error)}"}
+
+    async def get_risk_label_from_agent(self, analysis: Dict[str, Any],
+                                        session: Optional[aiohttp.ClientSession] = None) -> str:
         """Uses an agent to determine a risk label from a coordinator's analysis."""
         if "error" in analysis:
             return "Unknown"
 
-        print("🏷️  Querying Risk Labeler Agent...")
+        logger.info("🏷️  Querying Risk Labeler Agent...")
         
         prompt = f"""
         Analyze the provided JSON. Classify the risk into one of these exact categories: Very high, High, Moderate, Low, None.
         Your response must contain ONLY the category name and nothing else. Do not add any explanation or conversational text.
 
         Analysis JSON:
-        {json.dumps(analysis, indent=2)}
+        {self.prompts.verdict("risk_labeler", analysis)}
         """
         
-        response = await self.run_agent(
-            "risk_labeler",
-            self.agent_ids["risk_labeler"],
-            prompt
-        )
+        with stage("risk_label"):
+            response = await self.run_agent(
+                "risk_labeler",
+                self.agent_ids["risk_labeler"],
+                prompt,
+                session=session,
+            )
         
+        if "error" in response:
+            # Letta is failing or the circuit is open: fall back to the score thresholds.
+            return self.get_risk_label(self.coordinator_risk_score(analysis))
         return response.get("risk_label", "Unknown")
 
-    async def summarize_analysis(self, agent_type: str, analysis: Dict[str, Any]) -> str:
+    async def summarize_analysis(self, agent_type: str, analysis: Dict[str, Any],
+                                 session: Optional[aiohttp.ClientSession] = None) -> str:
         """Uses the presenter agent to summarize a specialist agent's analysis."""
         if "error" in analysis:
             return f"Could not generate summary for {agent_type} because its analysis failed."
         
         # SPECIAL CASE: If target_analyst finds no shared targets, create a clean, hardcoded summary.
         if agent_type == 'target_analyst' and not analysis.get('shared_targets'):
-            print(f"✍️  Generating hardcoded summary for {agent_type} (no shared targets).")
+            logger.info("✍️  Generating hardcoded summary for %s (no shared targets).", agent_type)
             return "The analysis found no shared protein targets between the two drugs."
 
-        print(f"✍️ Summarizing analysis from {agent_type}...")
+        logger.info("✍️ Summarizing analysis from %s...", agent_type)
         
-        # Convert analysis to a clean JSON string
-        analysis_json = json.dumps(analysis, indent=2)
+        # Only the fields the summary draws on, compactly serialized
+        analysis_json = self.prompts.analysis(agent_type, analysis)
         
         # Create a more specific prompt based on agent type
         if agent_type == 'similarity_analyst':
@@ -200,51 +411,220 @@ Analysis data:
 
 Provide only the summary sentence, no other text."""
         
-        # Debugging log to print the analysis data
-        print(f"[DEBUG] Analysis for {agent_type}: {analysis_json}")
+        logger.debug("Analysis for %s: %s", agent_type, analysis_json)
         
-        summary_response = await self.run_agent(
-            "presenter",
-            self.agent_ids["presenter"],
-            presenter_prompt
-        )
+        with stage("summarize_analysis", agent=agent_type):
+            summary_response = await self.run_agent(
+                "presenter",
+                self.agent_ids["presenter"],
+                presenter_prompt,
+                session=session,
+            )
         
+        if "error" in summary_response:
+            return self.manual_summary_fallback(agent_type, analysis)
         return summary_response.get("summary", "Summary could not be generated by the presenter agent.")
 
     # Manual fallback function to generate a summary
     def manual_summary_fallback(self, agent_type: str, analysis: Dict[str, Any]) -> str:
+        if "error" in analysis:
+            return f"Could not generate summary for {agent_type} because its analysis failed."
+
         if agent_type == 'similarity_analyst':
-            drug1_analogs = analysis.get('drug1_analogs', {}).get('analogs', [])
-            drug2_analogs = analysis.get('drug2_analogs', {}).get('analogs', [])
-            inferred_interaction = analysis.get('inferred_interaction', 'No inferred interaction available.')
-            confidence_score = analysis.get('confidence_score', 'Unknown')
+            inferred_interaction = analysis.get('inferred_interaction') or ''
+            score = analysis.get('confidence_score', analysis.get('tanimoto_similarity'))
+            if not isinstance(score, (int, float)):
+                return f"The similarity analysis did not report a confidence score. {inferred_interaction}".strip()
+            # Same bands the local Tanimoto analysis uses.
+            if score >= 0.7:
+                strength = "strong structural similarity, suggesting an elevated risk of interaction"
+            elif score >= 0.4:
+                strength = "moderate structural similarity, so an interaction is plausible"
+            else:
+                strength = "little structural similarity, so a structure-based interaction is unlikely"
+            return f"The similarity analysis found {strength} (score: {score}). {inferred_interaction}".strip()
+
+        explanation = analysis.get('interaction_hypothesis') or analysis.get('explanation') or analysis.get('summary') or ''
+
+        if agent_type == 'chemical_analyst':
+            risk_score = analysis.get('risk_score', 'Unknown')
+            return f"The chemical analysis assigns a risk score of {risk_score}. {explanation}".strip()
+
+        if agent_type == 'pathway_analyst':
+            shared = analysis.get('shared_pathways') or []
+            risk = analysis.get('risk_level') or analysis.get('risk_score', 'Unknown')
+            if shared:
+                names = ', '.join(p if isinstance(p, str) else str(p.get('name', p)) for p in shared)
+                return f"The drugs act on the shared pathway(s) {names} (risk: {risk}). {explanation}".strip()
+            return f"The pathway analysis found no shared pathways (risk: {risk}). {explanation}".strip()
 
-            summary = f"The similarity analysis suggests a high risk of interaction between the drugs due to their analogs. {inferred_interaction} Confidence score: {confidence_score}."
-            return summary
+        if agent_type == 'target_analyst':
+            shared = analysis.get('shared_targets') or []
+            if not shared:
+                return "The analysis found no shared protein targets between the two drugs."
+            names = ', '.join(t if isinstance(t, str) else str(t.get('name', t)) for t in shared)
+            return f"The drugs share the protein target(s) {names}. {explanation}".strip()
+
+        if explanation:
+            return explanation
 
         return "No manual summary available."
 
-    async def run_agents(self, drug1: DrugInfo, drug2: DrugInfo) -> Dict[str, Any]:
-        """Runs all specialist agents and summarizes their findings."""
+    def manual_executive_summary(self, coordinator_response: Dict[str, Any]) -> Dict[str, Any]:
+        """Builds the executive summary from the coordinator's verdict without the presenter agent."""
+        if "error" in coordinator_response:
+            return {"error": "Coordinator agent failed, cannot generate summary."}
+
+        risk_score = self.coordinator_risk_score(coordinator_response)
+        reasoning = coordinator_response.get('reasoning') or coordinator_response.get('explanation') or ''
+        mechanisms = coordinator_response.get('key_mechanisms') or coordinator_response.get('mechanisms') or []
+        if isinstance(mechanisms, list):
+            mechanisms = '; '.join(str(m) for m in mechanisms)
+
+        summary = f"Final risk score: {risk_score if risk_score is not None else 'Unknown'} ({self.get_risk_label(risk_score)})."
+        if reasoning:
+            summary += f" {reasoning}"
+        if mechanisms:
+            summary += f" Key mechanisms: {mechanisms}."
+        return {"summary": summary}
+
+    def _analysis_nodes(self, drug1: DrugInfo, drug2: DrugInfo,
+                        session: Optional[aiohttp.ClientSession] = None, mode: str = "full") -> List[PipelineNode]:
+        """Pipeline nodes for the specialist agents and their per-agent presenter summaries."""
+        overlap = self.overlap(drug1, drug2)
         prompts = {
             "chemical_analyst": f"Drug 1: {drug1.name}, Drug 2: {drug2.name}. Analyze chemical properties.",
-            "pathway_analyst": f"Drug 1: {drug1.name} (Pathways: {drug1.pathways}), Drug 2: {drug2.name} (Pathways: {drug2.pathways}). Analyze shared pathways.",
-            "target_analyst": f"Drug 1: {drug1.name} (Targets: {drug1.targets}), Drug 2: {drug2.name} (Targets: {drug2.targets}). Analyze shared targets.",
+            "pathway_analyst": (
+                f"Drug 1: {drug1.name}, Drug 2: {drug2.name}. Precomputed pathway overlap: "
+                f"shared {overlap['shared_pathways'] or 'none'}; only {drug1.name} {overlap['drug1_only_pathways']}; "
+                f"only {drug2.name} {overlap['drug2_only_pathways']}. Analyze shared pathways."
+            ),
+            "target_analyst": (
+                f"Drug 1: {drug1.name}, Drug 2: {drug2.name}. Precomputed target overlap: "
+                f"shared {overlap['shared_targets']}; only {drug1.name} {overlap['drug1_only_targets']}; "
+                f"only {drug2.name} {overlap['drug2_only_targets']}. Analyze shared targets."
+            ),
             "similarity_analyst": f"Drug 1: {drug1.name} (SMILES: {drug1.smiles}), Drug 2: {drug2.name} (SMILES: {drug2.smiles}). Analyze structural similarity.",
         }
-        
-        agent_types = list(prompts.keys())
-        analysis_tasks = [self.run_agent(at, self.agent_ids[at], p) for at, p in prompts.items()]
-        analyses = await asyncio.gather(*analysis_tasks)
-        
-        summary_tasks = [self.summarize_analysis(agent_types[i], analyses[i]) for i in range(len(agent_types))]
-        summaries = await asyncio.gather(*summary_tasks)
-        
-        return {
-            agent_types[i]: {"analysis": analyses[i], "summary": summaries[i]}
-            for i in range(len(agent_types))
+
+        local_similarity = None
+        if self.local_similarity != "off":
+            local_similarity = self.similarity_index.analyze_pair(drug1.name, drug2.name)
+        if local_similarity is not None and self.local_similarity == "context":
+            prompts["similarity_analyst"] += (
+                f" Precomputed fingerprint Tanimoto similarity: {local_similarity['tanimoto_similarity']}."
+                f" Nearest analogs of {drug1.name}: {local_similarity['drug1_analogs']['analogs']}."
+                f" Nearest analogs of {drug2.name}: {local_similarity['drug2_analogs']['analogs']}."
+            )
+
+        # Stand-ins used when an analyst's call fails or its circuit is open.
+        fallbacks = {
+            "pathway_analyst": {
+                "shared_pathways": overlap["shared_pathways"],
+                "explanation": f"Pathway overlap computed locally: shared {overlap['shared_pathways'] or 'none'}.",
+            },
+            "target_analyst": {
+                "shared_targets": overlap["shared_targets"],
+                "explanation": f"Target overlap computed locally: shared {overlap['shared_targets'] or 'none'}.",
+            },
+            "similarity_analyst": local_similarity or self.similarity_index.analyze_pair(drug1.name, drug2.name),
         }
 
+        nodes = []
+        for agent_type, prompt in prompts.items():
+            if agent_type == "similarity_analyst" and local_similarity is not None and self.local_similarity == "replace":
+                nodes.append(PipelineNode(agent_type, lambda deps: self._local_result(local_similarity), source="local"))
+            elif agent_type == "target_analyst" and not overlap["shared_targets"]:
+                # Nothing for the agent to reason about; this also skips its presenter summary.
+                nodes.append(PipelineNode(agent_type, lambda deps: self._local_result({
+                    "shared_targets": [],
+                    "explanation": f"{drug1.name} ({', '.join(overlap['drug1_only_targets']) or 'no known targets'}) and "
+                                   f"{drug2.name} ({', '.join(overlap['drug2_only_targets']) or 'no known targets'}) share no protein targets.",
+                    "source": "local",
+                }), source="local"))
+            else:
+                nodes.append(PipelineNode(
+                    agent_type,
+                    lambda deps, at=agent_type, p=prompt: self._agent_or_fallback(
+                        at, self.run_agent(at, self.agent_ids[at], p, session=session), fallbacks.get(at)
+                    ),
+                ))
+            if mode == "fast":
+                nodes.append(PipelineNode(
+                    f"{agent_type}_summary",
+                    lambda deps, at=agent_type: self._local_result(self.manual_summary_fallback(at, deps[at])),
+                    inputs=[agent_type],
+                    source="local",
+                ))
+            elif mode == "full":
+                # summarize_analysis writes the no-shared-targets summary itself, without the presenter.
+                skips_presenter = agent_type == "target_analyst" and not overlap["shared_targets"]
+                nodes.append(PipelineNode(
+                    f"{agent_type}_summary",
+                    lambda deps, at=agent_type: self.summarize_analysis(at, deps[at], session=session),
+                    inputs=[agent_type],
+                    source="local" if skips_presenter else "agent",
+                ))
+        return nodes
+
+    def update_drug(self, drug: DrugInfo, previous: Optional[DrugInfo] = None) -> bool:
+        """
+        Refreshes the local indexes for an added or edited drug. When its targets, pathways
+        or structure changed, its cached pairs are dropped and True is returned.
+        """
+        key = drug.name.lower()
+        before = (self.overlap_index.drug_targets.get(key), self.overlap_index.drug_pathways.get(key))
+        self.overlap_index.add(drug.name, drug.targets, drug.pathways)
+        after = (self.overlap_index.drug_targets.get(key), self.overlap_index.drug_pathways.get(key))
+        structure_changed = drug.smiles and (previous is None or previous.smiles != drug.smiles)
+        if structure_changed:
+            self.similarity_index.upsert(drug.name, drug.smiles)
+        if before == after and not structure_changed:
+            return False
+        removed = self.cache.invalidate(drug.name)
+        logger.info("💊 %s changed, dropped %d cached prediction(s)", drug.name, removed)
+        return True
+
+    def overlap(self, drug1: DrugInfo, drug2: DrugInfo) -> Dict[str, List[str]]:
+        """Shared and drug-specific targets and pathways, from the inverted index."""
+        for drug in (drug1, drug2):
+            if drug.name not in self.overlap_index:
+                self.overlap_index.add(drug.name, drug.targets, drug.pathways)
+        return self.overlap_index.overlap(drug1.name, drug2.name)
+
+    async def _local_result(self, result: Any) -> Any:
+        """Wraps a locally computed analysis so it can stand in for an agent node."""
+        return result
+
+    async def _agent_or_fallback(self, agent_type: str, call: Awaitable[Dict[str, Any]],
+                                 fallback: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Awaits an agent call, substituting the local fallback if the agent failed."""
+        result = await call
+        if "error" in result and fallback is not None:
+            logger.warning("🛟 %s unavailable (%s), using local analysis", agent_type, result["error"])
+            FALLBACKS.labels(agent_type).inc()
+            return {**fallback, "source": "local", "fallback_reason": result["error"]}
+        return result
+
+    def coordinator_risk_score(self, coordinator_response: Dict[str, Any]) -> Optional[float]:
+        """Pulls the numeric risk score out of a coordinator verdict, if it has one."""
+        for key in ("risk_score", "final_risk_score", "overall_risk_score"):
+            value = coordinator_response.get(key)
+            if isinstance(value, (int, float)):
+                return value
+            if isinstance(value, str):
+                try:
+                    return float(value)
+                except ValueError:
+                    pass
+        return None
+
+    async def local_risk_label(self, coordinator_response: Dict[str, Any]) -> str:
+        """Threshold-based risk label from the coordinator's numeric score."""
+        if "error" in coordinator_response:
+            return "Unknown"
+        return self.get_risk_label(self.coordinator_risk_score(coordinator_response))
+
     def get_risk_label(self, risk_score: float) -> str:
         """Returns a descriptive label for a given risk score."""
         if not isinstance(risk_score, (int, float)):
@@ -259,61 +639,457 @@ Provide only the summary sentence, no other text."""
             return "Low"
         return "Minimal"
 
-    async def predict_ddi(self, drug1: DrugInfo, drug2: DrugInfo) -> Dict[str, Any]:
-        """
-        Runs the full DDI analysis pipeline, including summarization and labeling.
+    async def _coordinate(self, drug1: DrugInfo, drug2: DrugInfo, analyses: Dict[str, Any],
+                          session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
+        """Sends the raw specialist analyses to the coordinator agent."""
+        coordinator_input = self.prompts.coordinator_input(asdict(drug1), asdict(drug2), analyses)
+
+        logger.info("🔬 Sending collected analyses to Coordinator Agent...")
+        with stage("coordinator"):
+            return await self.run_agent(
+                "coordinator",
+                self.agent_ids["coordinator"],
+                coordinator_input,
+                session=session,
+            )
+
+    async def executive_summary(self, coordinator_response: Dict[str, Any],
+                                session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
+        """Uses the presenter agent to write the final summary of the coordinator's verdict."""
+        if "error" in coordinator_response:
+            return {"error": "Coordinator agent failed, cannot generate summary."}
+
+        logger.info("✍️  Querying Presenter for the executive summary...")
+
+        # Use a different prompt for the final executive summary to be more thorough
+        executive_summary_prompt = f"""
+        You are an expert medical summarizer. Analyze the following JSON, which contains the final verdict on a drug-drug interaction.
+        Create a clear, human-readable summary for a healthcare professional. Explain the final risk score, the reasoning, and the key interaction mechanisms identified.
+        Your response must contain ONLY the summary text and nothing else.
+
+        JSON Analysis:
+        {self.prompts.verdict("presenter", coordinator_response)}
         """
-        agent_responses = await self.run_agents(drug1, drug2)
 
-        # We need to extract just the raw analysis for the coordinator
-        coordinator_input_analyses = {k: v["analysis"] for k, v in agent_responses.items()}
+        with stage("executive_summary"):
+            response = await self.run_agent("presenter", self.agent_ids["presenter"], executive_summary_prompt, session=session)
+        if "error" in response:
+            return self.manual_executive_summary(coordinator_response)
+        return response
 
-        coordinator_input = {
-            "drug1": asdict(drug1),
-            "drug2": asdict(drug2),
-            "agent_analyses": coordinator_input_analyses
-        }
-        
-        print("🔬 Sending collected analyses to Coordinator Agent...")
-        coordinator_response = await self.run_agent(
-            "coordinator", 
-            self.agent_ids["coordinator"], 
-            json.dumps(coordinator_input, indent=2)
+    def _batched_prompt(self, analyses: Dict[str, Dict[str, Any]], coordinator_response: Dict[str, Any]) -> str:
+        sections = [f"## {agent_type}\n<one clear sentence summarizing this analysis for a healthcare professional>"
+                    for agent_type in analyses]
+        prompt = (
+            "You are an expert medical summarizer. Below are specialist analyses of a drug-drug interaction"
+            + (" and the coordinator's final verdict" if "error" not in coordinator_response else "") + ".\n"
+            "Answer with exactly the sections below, each starting with its header line as shown, and nothing else.\n\n"
         )
+        if "error" not in coordinator_response:
+            sections += [
+                "## executive_summary\n<a clear, human-readable summary of the final verdict: the risk score, "
+                "the reasoning and the key interaction mechanisms>",
+                "## risk_label\n<exactly one of: Very high, High, Moderate, Low, None>",
+            ]
+        prompt += "\n".join(sections)
+        prompt += f"\n\nAnalyses JSON:\n{self.prompts.analyses(analyses)}"
+        if "error" not in coordinator_response:
+            prompt += f"\n\nVerdict JSON:\n{self.prompts.verdict('presenter', coordinator_response)}"
+        return prompt
 
-        presenter_summary = {"error": "Coordinator agent failed, cannot generate summary."}
-        risk_label = "Unknown"
+    @staticmethod
+    def parse_sections(text: str) -> Dict[str, str]:
+        """Splits a "## name" sectioned response into {name: body}; empty sections are left out."""
+        sections = {}
+        headers = list(SECTION_HEADER.finditer(text))
+        for header, following in zip(headers, headers[1:] + [None]):
+            body = text[header.end():following.start() if following else len(text)].strip()
+            if body:
+                sections[header.group(1).lower()] = body
+        return sections
 
-        if "error" not in coordinator_response:
-            print("✍️  Querying Presenter and Risk Labeler agents in parallel...")
-            
-            # Use a different prompt for the final executive summary to be more thorough
-            executive_summary_prompt = f"""
-            You are an expert medical summarizer. Analyze the following JSON, which contains the final verdict on a drug-drug interaction.
-            Create a clear, human-readable summary for a healthcare professional. Explain the final risk score, the reasoning, and the key interaction mechanisms identified.
-            Your response must contain ONLY the summary text and nothing else.
-
-            JSON Analysis:
-            {json.dumps(coordinator_response, indent=2)}
-            """
-            
-            presenter_task = self.run_agent("presenter", self.agent_ids["presenter"], executive_summary_prompt)
-            risk_labeler_task = self.get_risk_label_from_agent(coordinator_response)
+    async def batched_presentation(self, analyses: Dict[str, Dict[str, Any]], coordinator_response: Dict[str, Any],
+                                   session: Optional[aiohttp.ClientSession] = None) -> Dict[str, Any]:
+        """
+        One presenter call for every per-agent summary, the executive summary and the risk
+        label. Sections that are missing or unusable fall back individually to the manual
+        templates and score thresholds; "fallbacks" lists the pipeline nodes that did, and
+        "sources" maps each node fed by this call to "agent" or "local".
+        """
+        summaries: Dict[str, str] = {}
+        sources: Dict[str, str] = {}
+        to_summarize = {}
+        for agent_type, analysis in analyses.items():
+            if "error" in analysis:
+                summaries[agent_type] = f"Could not generate summary for {agent_type} because its analysis failed."
+                sources[f"{agent_type}_summary"] = "local"
+            elif agent_type == "target_analyst" and not analysis.get("shared_targets"):
+                summaries[agent_type] = "The analysis found no shared protein targets between the two drugs."
+                sources[f"{agent_type}_summary"] = "local"
+            else:
+                to_summarize[agent_type] = analysis
 
-            summary_response, risk_label_text = await asyncio.gather(presenter_task, risk_labeler_task)
-            
-            presenter_summary = summary_response
-            risk_label = risk_label_text
-            coordinator_response["risk_label"] = risk_label
+        sections: Dict[str, str] = {}
+        called = bool(to_summarize) or "error" not in coordinator_response
+        sources["presenter_batch"] = "agent" if called else "local"
+        if called:
+            logger.info("✍️  Querying Presenter for all summaries in one call...")
+            with stage("batched_presentation"):
+                response = await self.run_agent("presenter_batch", self.agent_ids["presenter"],
+                                                self._batched_prompt(to_summarize, coordinator_response), session=session)
+            if "error" not in response:
+                sections = self.parse_sections(response["text"])
+
+        fallbacks = []
+        for agent_type, analysis in to_summarize.items():
+            if agent_type in sections:
+                summaries[agent_type] = " ".join(sections[agent_type].split())
+                sources[f"{agent_type}_summary"] = "agent"
+            else:
+                summaries[agent_type] = self.manual_summary_fallback(agent_type, analysis)
+                fallbacks.append(f"{agent_type}_summary")
+
+        if "error" in coordinator_response:
+            executive = {"error": "Coordinator agent failed, cannot generate summary."}
+            risk_label = "Unknown"
+            sources["executive_summary"] = sources["risk_label"] = "local"
+        else:
+            if "executive_summary" in sections:
+                executive = {"summary": sections["executive_summary"]}
+                sources["executive_summary"] = "agent"
+            else:
+                executive = self.manual_executive_summary(coordinator_response)
+                fallbacks.append("executive_summary")
+            label_lines = sections.get("risk_label", "").splitlines()
+            risk_label = RISK_LABELS.get(label_lines[0].strip(" .*").lower()) if label_lines else None
+            if risk_label is None:
+                risk_label = self.get_risk_label(self.coordinator_risk_score(coordinator_response))
+                fallbacks.append("risk_label")
+            else:
+                sources["risk_label"] = "agent"
+        for name in fallbacks:
+            sources[name] = "local"
+
+        if fallbacks:
+            logger.warning("Batched presenter response missing sections, using fallbacks for: %s", ", ".join(fallbacks))
+        return {"summaries": summaries, "executive_summary": executive, "risk_label": risk_label,
+                "fallbacks": fallbacks, "sources": sources}
+
+    def build_pipeline(self, drug1: DrugInfo, drug2: DrugInfo,
+                       session: Optional[aiohttp.ClientSession] = None, mode: str = "full") -> List[PipelineNode]:
+        """
+        The full DDI pipeline as a dependency graph. The coordinator only needs the raw
+        analyses, so it runs alongside the per-agent summaries rather than after them.
+
+        In "fast" mode the presenter and risk-labeler calls are replaced by local templates
+        and score thresholds, leaving only the specialist and coordinator agents. In "batched"
+        mode they become a single presenter call after the coordinator, trading the overlap
+        of summaries with the coordinator for five fewer Letta round trips.
+        """
+        if mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+
+        if mode == "fast":
+            finishing = [
+                PipelineNode(
+                    "executive_summary",
+                    lambda deps: self._local_result(self.manual_executive_summary(deps["coordinator"])),
+                    inputs=["coordinator"],
+                    source="local",
+                ),
+                PipelineNode(
+                    "risk_label",
+                    lambda deps: self.local_risk_label(deps["coordinator"]),
+                    inputs=["coordinator"],
+                    source="local",
+                ),
+            ]
+        elif mode == "batched":
+            finishing = [
+                PipelineNode(
+                    "presenter_batch",
+                    lambda deps: self.batched_presentation(
+                        {at: deps[at] for at in ANALYST_TYPES}, deps["coordinator"], session=session
+                    ),
+                    inputs=list(ANALYST_TYPES) + ["coordinator"],
+                ),
+                PipelineNode(
+                    "executive_summary",
+                    lambda deps: self._local_result(deps["presenter_batch"]["executive_summary"]),
+                    inputs=["presenter_batch"],
+                ),
+                PipelineNode(
+                    "risk_label",
+                    lambda deps: self._local_result(deps["presenter_batch"]["risk_label"]),
+                    inputs=["presenter_batch"],
+                ),
+            ] + [
+                PipelineNode(
+                    f"{agent_type}_summary",
+                    lambda deps, at=agent_type: self._local_result(deps["presenter_batch"]["summaries"][at]),
+                    inputs=["presenter_batch"],
+                )
+                for agent_type in ANALYST_TYPES
+            ]
+        else:
+            finishing = [
+                PipelineNode(
+                    "executive_summary",
+                    lambda deps: self.executive_summary(deps["coordinator"], session=session),
+                    inputs=["coordinator"],
+                ),
+                PipelineNode(
+                    "risk_label",
+                    lambda deps: self.get_risk_label_from_agent(deps["coordinator"], session=session),
+                    inputs=["coordinator"],
+                ),
+            ]
 
+        return self._analysis_nodes(drug1, drug2, session, mode) + [
+            PipelineNode(
+                "coordinator",
+                lambda deps: self._coordinate(drug1, drug2, deps, session=session),
+                inputs=list(ANALYST_TYPES),
+            ),
+        ] + finishing
+
+    def assemble_result(self, results: Dict[str, Any], timings: Dict[str, Dict[str, float]],
+                        sources: Dict[str, str], mode: str = "full",
+                        unfinished: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Shapes the per-node pipeline results into the /predict response. Nodes listed in
+        `unfinished` were cut off by the deadline and are reported as errors.
+        """
+        if unfinished:
+            error = {"error": "Deadline exceeded before this stage finished"}
+            for name in unfinished:
+                results[name] = "Unknown" if name == "risk_label" else None if name.endswith("_summary") else dict(error)
+                sources[name] = "cancelled"
+
+        agent_responses = {
+            agent_type: {"analysis": results[agent_type], "summary": results[f"{agent_type}_summary"]}
+            for agent_type in ANALYST_TYPES
+        }
+
+        coordinator_response = results["coordinator"]
+        if "error" not in coordinator_response:
+            coordinator_response["risk_label"] = results["risk_label"]
+
+        partial = {"partial": True, "unfinished": unfinished} if unfinished else {}
         return {
             "agent_responses": agent_responses,
             "final_verdict": coordinator_response,
-            "presenter_summary": presenter_summary,
+            "presenter_summary": results["executive_summary"],
+            "mode": mode,
+            "sources": {
+                **{f"{agent_type}.analysis": sources[agent_type] for agent_type in ANALYST_TYPES},
+                **{f"{agent_type}.summary": sources[f"{agent_type}_summary"] for agent_type in ANALYST_TYPES},
+                "final_verdict": sources["coordinator"],
+                "presenter_summary": sources["executive_summary"],
+                "risk_label": sources["risk_label"],
+            },
+            "timings": timings,
+            **partial,
+        }
+
+    def _node_event(self, node: NodeResult) -> Tuple[str, Dict[str, Any]]:
+        """Maps a finished pipeline node onto the event emitted for it on the stream."""
+        if node.name in ANALYST_TYPES:
+            event, data = "analysis", {"agent": node.name, "analysis": node.result}
+        elif node.name.endswith("_summary") and node.name[:-len("_summary")] in ANALYST_TYPES:
+            event, data = "summary", {"agent": node.name[:-len("_summary")], "summary": node.result}
+        elif node.name == "coordinator":
+            event, data = "verdict", {"final_verdict": node.result}
+        elif node.name == "executive_summary":
+            event, data = "presenter_summary", {"presenter_summary": node.result}
+        else:
+            event, data = node.name, {node.name: node.result}
+        return event, {**data, "source": node.source, "timing": node.timing()}
+
+    # --- Known interactions ---
+
+    def known_result(self, known: KnownInteraction, mode: str = "full") -> Dict[str, Any]:
+        """A /predict response built from a curated interaction alone."""
+        verdict = known.verdict()
+        return {
+            "agent_responses": {},
+            "final_verdict": verdict,
+            "presenter_summary": self.manual_executive_summary(verdict),
+            "mode": mode,
+            "sources": {"final_verdict": "known_interaction", "presenter_summary": "local",
+                        "risk_label": "known_interaction"},
+            "timings": {},
+            "known_interaction": {"source": known.source, "enriched": False},
         }
 
-# --- In-Memory Drug Database ---
-# (In a real application, this would be a proper database)
+    def enriched_result(self, known: KnownInteraction, agent_result: Dict[str, Any]) -> Dict[str, Any]:
+        """The curated verdict stays authoritative; the agents add their analyses and their own verdict."""
+        result = self.known_result(known, agent_result.get("mode", "full"))
+        result["agent_responses"] = agent_result["agent_responses"]
+        result["final_verdict"]["agent_verdict"] = agent_result["final_verdict"]
+        result["sources"] = {**agent_result["sources"], **result["sources"]}
+        result["timings"] = agent_result["timings"]
+        result["known_interaction"]["enriched"] = True
+        return result
+
+    def _start_enrichment(self, drug1: DrugInfo, drug2: DrugInfo, known: KnownInteraction,
+                          session: Optional[aiohttp.ClientSession] = None, mode: str = "full"):
+        key = self.cache_key(drug1, drug2, mode)
+        if key in self._enriching or self.cache.contains(key):
+            return
+        self._enriching.add(key)
+        task = asyncio.ensure_future(self._enrich(key, drug1, drug2, known, session, mode))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _enrich(self, key: str, drug1: DrugInfo, drug2: DrugInfo, known: KnownInteraction,
+                      session: Optional[aiohttp.ClientSession] = None, mode: str = "full"):
+        """Runs the agents for a known pair at background priority and caches the enriched result."""
+        set_call_class("background", "enrich")
+        # Not bounded by the deadline of the request that happened to start it.
+        set_deadline(None)
+        try:
+            result = await self.predict_ddi(drug1, drug2, session, mode, use_known=False)
+        except Exception as e:
+            logger.warning("Enrichment failed for %s + %s: %s", drug1.name, drug2.name, e)
+            return
+        finally:
+            self._enriching.discard(key)
+        if self.is_cacheable(result):
+            self.cache.set(key, drug1.name, drug2.name, self.enriched_result(known, result))
+            logger.info("📚 Enriched known interaction %s + %s with agent analyses", drug1.name, drug2.name)
+
+    async def stream_ddi(self, drug1: DrugInfo, drug2: DrugInfo, session: Optional[aiohttp.ClientSession] = None,
+                         mode: str = "full", use_known: bool = True) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Runs the DDI pipeline and yields (event, data) pairs as each stage completes:
+        specialist analyses in completion order, their summaries, the coordinator verdict,
+        then the executive summary and risk label. The last event is "result", carrying
+        the same payload /predict returns. Pairs in the known-interaction knowledge base
+        are answered from it directly unless `use_known` is False.
+
+        If the request's deadline passes first, outstanding agent calls are cancelled and
+        the result carries whatever finished, marked partial.
+        """
+        known = self.known_interactions.lookup(drug1.name, drug2.name) if use_known else None
+        if known is not None:
+            logger.info("📚 Known interaction for %s + %s (%s)", drug1.name, drug2.name, known.source)
+            if self.enrich_known:
+                self._start_enrichment(drug1, drug2, known, session, mode)
+            for event in self.replay_events(self.known_result(known, mode)):
+                yield event
+            return
+
+        results: Dict[str, Any] = {}
+        timings: Dict[str, Dict[str, float]] = {}
+        sources: Dict[str, str] = {}
+        nodes = self.build_pipeline(drug1, drug2, session, mode)
+        PIPELINES_IN_FLIGHT.inc()
+        try:
+            async for node in iter_pipeline(nodes, deadline=current_deadline()):
+                batch = node.result if node.name == "presenter_batch" else results.get("presenter_batch")
+                if isinstance(batch, dict) and "sources" in batch:
+                    # The batched presenter and the nodes carrying its sections report where each
+                    # section actually came from.
+                    node.source = batch["sources"].get(node.name, node.source)
+                results[node.name] = node.result
+                timings[node.name] = node.timing()
+                sources[node.name] = node.source
+                NODE_LATENCY.labels(node.name, node.source).observe(node.duration)
+                if node.name in ANALYST_TYPES and all(a in results for a in ANALYST_TYPES):
+                    # The analyst phase: pipeline start until the last specialist finished.
+                    STAGE_LATENCY.labels("run_agents").observe(node.finished)
+                if node.name == "presenter_batch":
+                    # Internal: its sections are streamed by the summary, verdict and label nodes.
+                    continue
+                yield self._node_event(node)
+        finally:
+            PIPELINES_IN_FLIGHT.dec()
+
+        unfinished = [node.name for node in nodes if node.name not in results]
+        if unfinished:
+            PIPELINES_CANCELLED.labels("deadline").inc()
+            logger.warning("⏱️ Deadline exceeded for %s + %s; unfinished: %s", drug1.name, drug2.name,
+                           ", ".join(unfinished))
+        yield "result", self.assemble_result(results, timings, sources, mode, unfinished)
+
+    def replay_events(self, result: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Rebuilds the stream events for an already-computed (e.g. cached) prediction."""
+        events = []
+        for agent_type, response in result["agent_responses"].items():
+            events.append(("analysis", {"agent": agent_type, "analysis": response["analysis"]}))
+        for agent_type, response in result["agent_responses"].items():
+            events.append(("summary", {"agent": agent_type, "summary": response["summary"]}))
+        events.append(("verdict", {"final_verdict": result["final_verdict"]}))
+        events.append(("presenter_summary", {"presenter_summary": result["presenter_summary"]}))
+        events.append(("risk_label", {"risk_label": result["final_verdict"].get("risk_label", "Unknown")}))
+        events.append(("result", result))
+        return events
+
+    async def predict_ddi(self, drug1: DrugInfo, drug2: DrugInfo, session: Optional[aiohttp.ClientSession] = None,
+                          mode: str = "full", use_known: bool = True) -> Dict[str, Any]:
+        """
+        Runs the full DDI analysis pipeline, including summarization and labeling.
+        Known interactions are answered from the curated knowledge base first.
+        """
+        with span("predict_ddi", drug1=drug1.name, drug2=drug2.name, mode=mode):
+            async for event, data in self.stream_ddi(drug1, drug2, session, mode, use_known):
+                if event == "result":
+                    return data
+        raise RuntimeError("DDI pipeline ended without producing a result")
+
+    def pipeline_variant(self, mode: str = "full") -> str:
+        """Describes the configuration choices that change what the pipeline produces."""
+        return f"mode={mode};similarity={self.local_similarity}"
+
+    def cache_key(self, drug1: DrugInfo, drug2: DrugInfo, mode: str = "full") -> str:
+        """Order-independent cache key for a drug pair under the current agents, prompts and mode."""
+        return make_cache_key(drug1.name, drug2.name, self.agent_ids,
+                              prompt_version=f"{PROMPT_VERSION}:{self.pipeline_variant(mode)}")
+
+    def is_cacheable(self, result: Dict[str, Any]) -> bool:
+        """
+        Failed verdicts and results built on local fallbacks for a degraded agent are not
+        cached, nor are bare curated answers, which are instant and follow the knowledge base.
+        """
+        if "error" in result["final_verdict"] or result.get("partial"):
+            return False
+        if "known_interaction" in result and not result["known_interaction"]["enriched"]:
+            return False
+        return not any(
+            isinstance(response["analysis"], dict) and "fallback_reason" in response["analysis"]
+            for response in result["agent_responses"].values()
+        )
+
+    async def cached_predict_ddi(self, drug1: DrugInfo, drug2: DrugInfo,
+                                 session: Optional[aiohttp.ClientSession] = None, mode: str = "full",
+                                 use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Returns a cached prediction for the pair if one exists, otherwise runs predict_ddi
+        and stores the result. Concurrent misses for the same pair share a single pipeline run.
+        Failed coordinator runs and degraded results are never cached. `use_cache=False`
+        skips the lookup (the fresh result is still stored), e.g. for benchmarking.
+        """
+        key = self.cache_key(drug1, drug2, mode)
+        cached = self.cache.get(key) if use_cache else None
+        if cached is not None:
+            logger.info("⚡ Cache hit for %s + %s", drug1.name, drug2.name)
+            return {**cached, "cache": "hit"}
+
+        result, shared = await self.inflight.do(key, lambda: self._predict_and_store(key, drug1, drug2, session, mode))
+        if shared:
+            logger.info("🔗 Joined in-flight prediction for %s + %s", drug1.name, drug2.name)
+        return {**result, "cache": "shared" if shared else "miss"}
+
+    async def _predict_and_store(self, key: str, drug1: DrugInfo, drug2: DrugInfo,
+                                 session: Optional[aiohttp.ClientSession] = None, mode: str = "full") -> Dict[str, Any]:
+        result = await self.predict_ddi(drug1, drug2, session, mode)
+        if self.is_cacheable(result):
+            self.cache.set(key, drug1.name, drug2.name, result)
+        return result
+
+# --- Drug Store ---
+# Built-in drugs, used as-is by default and to seed an empty on-disk store.
 DRUG_DATABASE = {
     "warfarin": DrugInfo(
         name="Warfarin",
@@ -345,10 +1121,73 @@ DRUG_DATABASE = {
     )
 }
 
+BRAND_NAMES = {
+    "warfarin": ["Coumadin", "Jantoven"],
+    "aspirin": ["Bayer", "Bufferin", "Ecotrin"],
+    "ibuprofen": ["Advil", "Motrin", "Nuprin"],
+    "acetaminophen": ["Tylenol", "Panadol"],
+}
+
+def open_drug_store() -> DrugStore:
+    """
+    Uses the SQLite formulary at DRUG_STORE_PATH when set (seeding it with the built-in
+    drugs if it is empty), otherwise an in-memory store of the built-in drugs.
+    """
+    path = os.getenv("DRUG_STORE_PATH")
+    if not path:
+        return InMemoryDrugStore(DRUG_DATABASE, BRAND_NAMES)
+
+    store = SQLiteDrugStore(path, cache_size=int(os.getenv("DRUG_STORE_CACHE_SIZE", 1024)))
+    if len(store) == 0:
+        for key, drug in DRUG_DATABASE.items():
+            store.add(drug, BRAND_NAMES.get(key, ()))
+    logger.info("💊 Using drug store at %s (%d drugs)", path, len(store))
+    return store
+
+drug_store = open_drug_store()
+
 # --- FastAPI App ---
+ddi_system = LettaDDIAgentSystem(drug_store)
+letta_pool = LettaConnectionPool.from_env(ddi_system.base_url)
+# Off by default: warming spends Letta credits on pairs nobody may ask for.
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "0") == "1"
+# POST /drugs writes to the formulary and spends Letta calls on recomputation, so it is
+# disabled unless an admin token is configured and sent as "Authorization: Bearer <token>".
+DRUG_ADMIN_TOKEN = os.getenv("DRUG_ADMIN_TOKEN")
+precomputer = Precomputer.from_env(ddi_system, drug_store, lambda: letta_pool.session)
+
+async def run_ddi_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one queued /jobs prediction; raising marks the job failed."""
+    drugs, missing = drug_store.resolve(job["drug1"], job["drug2"])
+    if missing:
+        raise ValueError(f"Drugs not found in database: {', '.join(missing)}")
+    set_call_class("batch", f"job-{job['id']}")
+    result = await ddi_system.cached_predict_ddi(*drugs, session=letta_pool.session, mode=job["mode"])
+    if "error" in result["final_verdict"]:
+        raise RuntimeError(result["final_verdict"]["error"])
+    return result
+
+jobs = JobQueue.from_env(run_ddi_job)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens the shared Letta connection pool at startup and closes it on shutdown."""
+    # Off the event loop, so a large formulary does not block startup of the pool.
+    await asyncio.to_thread(ddi_system.build_indexes)
+    await letta_pool.open()
+    await letta_pool.prewarm(int(os.getenv("LETTA_POOL_PREWARM", 0)))
+    await jobs.start()
+    if PRECOMPUTE_ENABLED:
+        precomputer.start()
+    yield
+    await precomputer.stop()
+    await jobs.stop()
+    await letta_pool.close()
+
 app = FastAPI(
     title="Dr. Strange DDI Engine",
-    description="A multi-agent system using Letta Cloud for DDI prediction."
+    description="A multi-agent system using Letta Cloud for DDI prediction.",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -359,34 +1198,334 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Seconds a /predict or /predict/stream request may spend on agents before outstanding calls
+# are cancelled and partial results returned; 0 disables the default.
+DEFAULT_DEADLINE = float(os.getenv("DDI_DEADLINE", 120))
+# Upper bound on a client-requested deadline; 0 leaves it uncapped.
+MAX_DEADLINE = float(os.getenv("DDI_MAX_DEADLINE", 300))
+DISCONNECT_POLL_INTERVAL = 0.5
+
 class DDIRequest(BaseModel):
     drug1_name: str
     drug2_name: str
+    mode: Literal["full", "batched", "fast"] = "full"
+    deadline: Optional[float] = Field(None, gt=0)  # seconds; defaults to DDI_DEADLINE, capped at DDI_MAX_DEADLINE
+    no_cache: bool = False  # skip the prediction cache lookup
+
+def request_deadline(request: DDIRequest) -> float:
+    deadline = request.deadline or DEFAULT_DEADLINE
+    return min(deadline, MAX_DEADLINE) if MAX_DEADLINE else deadline
+
+class DDIJobRequest(BaseModel):
+    drug1_name: str
+    drug2_name: str
+    mode: Literal["full", "batched", "fast"] = "full"
+    webhook_url: Optional[str] = None
+
+class DrugPayload(BaseModel):
+    name: str
+    smiles: str = ""
+    targets: List[str] = []
+    pathways: List[str] = []
+    properties: Dict[str, Any] = {}
+    brand_names: List[str] = []
+
+class DDIBatchRequest(BaseModel):
+    drug_names: List[str]
+    mode: Literal["full", "batched", "fast"] = "full"
+    no_cache: bool = False
+
+# Global cap on predictions running on behalf of /predict/batch, shared by all batch requests.
+BATCH_CONCURRENCY = int(os.getenv("DDI_BATCH_CONCURRENCY", 4))
+batch_semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+# Ordering used to pick the worst risk across pairs; unrecognized labels rank lowest.
+RISK_SEVERITY = {"very high": 5, "high": 4, "moderate": 3, "low": 2, "minimal": 1, "none": 1, "unknown": 0}
+
+def risk_severity(label: str) -> int:
+    return RISK_SEVERITY.get(str(label).strip().lower(), 0)
 
-ddi_system = LettaDDIAgentSystem()
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def cancel_on_disconnect(http_request: Request, work: Awaitable[Any]) -> Any:
+    """
+    Awaits `work`, cancelling it if the client disconnects first. Returns None in that case.
+    Streaming responses need no help: Starlette cancels their generator on disconnect.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                PIPELINES_CANCELLED.labels("disconnect").inc()
+                logger.info("🔌 Client disconnected; cancelling its prediction")
+                return None
+    finally:
+        task.cancel()
 
 @app.post("/predict", summary="Predict Drug-Drug Interaction")
-async def predict_ddi_endpoint(request: DDIRequest):
+async def predict_ddi_endpoint(request: DDIRequest, http_request: Request):
     """
     Takes two drug names, looks them up, and runs the full DDI analysis pipeline.
+    Stages still running at the deadline are cancelled and the finished ones returned.
     """
-    drug1_name = request.drug1_name.lower()
-    drug2_name = request.drug2_name.lower()
-
-    if drug1_name not in DRUG_DATABASE or drug2_name not in DRUG_DATABASE:
-        missing = [d for d in [drug1_name, drug2_name] if d not in DRUG_DATABASE]
-        return {"error": f"Drugs not found in database: {', '.join(missing)}"}, 404
-
-    drug1 = DRUG_DATABASE[drug1_name]
-    drug2 = DRUG_DATABASE[drug2_name]
-    
-    # The session needs to be managed within the request context for FastAPI
-    async with aiohttp.ClientSession() as session:
-        ddi_system.session = session
-        result = await ddi_system.predict_ddi(drug1, drug2)
-        return result
+    drugs, missing = drug_store.resolve(request.drug1_name, request.drug2_name)
+    if missing:
+        return JSONResponse({"error": f"Drugs not found in database: {', '.join(missing)}"}, status_code=404)
+
+    drug1, drug2 = drugs
+    precomputer.record_query(drug1.name, drug2.name)
+    set_call_class("interactive")
+    set_deadline(request_deadline(request))
+
+    result = await cancel_on_disconnect(
+        http_request, ddi_system.cached_predict_ddi(drug1, drug2, session=letta_pool.session, mode=request.mode,
+                                                    use_cache=not request.no_cache)
+    )
+    if result is None:
+        return JSONResponse({"error": "Client disconnected"}, status_code=499)
+    return result
+
+@app.post("/predict/stream", summary="Stream Drug-Drug Interaction results as they complete")
+async def predict_ddi_stream_endpoint(request: DDIRequest):
+    """
+    Same pipeline as /predict, delivered as Server-Sent Events so each analysis,
+    summary and the final verdict reach the client as soon as they are ready.
+    """
+    drugs, missing = drug_store.resolve(request.drug1_name, request.drug2_name)
+    if missing:
+        return JSONResponse({"error": f"Drugs not found in database: {', '.join(missing)}"}, status_code=404)
+
+    drug1, drug2 = drugs
+    precomputer.record_query(drug1.name, drug2.name)
+
+    async def events():
+        set_call_class("interactive")
+        set_deadline(request_deadline(request))
+        key = ddi_system.cache_key(drug1, drug2, request.mode)
+        cached = ddi_system.cache.get(key) if not request.no_cache else None
+        if cached is not None:
+            for event, data in ddi_system.replay_events({**cached, "cache": "hit"}):
+                yield sse_event(event, data)
+            return
+
+        async for event, data in ddi_system.stream_ddi(drug1, drug2, session=letta_pool.session, mode=request.mode):
+            if event == "result":
+                if ddi_system.is_cacheable(data):
+                    ddi_system.cache.set(key, drug1.name, drug2.name, data)
+                data = {**data, "cache": "miss"}
+            yield sse_event(event, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/predict/batch", summary="Predict interactions for every pair in a medication list")
+async def predict_ddi_batch_endpoint(request: DDIBatchRequest):
+    """
+    Canonicalizes and deduplicates the unordered pairs of a medication list, runs them
+    under the global batch concurrency limit and streams each pair's result as
+    Server-Sent Events, finishing with a worst-risk matrix over the whole list.
+    """
+    found, missing = drug_store.resolve(*(name for name in request.drug_names if name.strip()))
+    # Brand and generic names for the same drug collapse onto one canonical entry.
+    by_name = {drug.name.lower(): drug for drug in found}
+    known = list(by_name)
+    missing = list(dict.fromkeys(missing))
+    if len(known) < 2:
+        return JSONResponse(
+            {"error": "At least two known drugs are required", "missing": missing},
+            status_code=400 if not missing else 404,
+        )
+
+    pairs = list(itertools.combinations(sorted(known), 2))
+    # One flow per batch request, so concurrent batches share the batch class fairly.
+    flow = f"batch-{uuid.uuid4().hex[:12]}"
+
+    async def run_pair(name1: str, name2: str):
+        set_call_class("batch", flow)
+        async with batch_semaphore:
+            try:
+                result = await ddi_system.cached_predict_ddi(
+                    by_name[name1], by_name[name2], session=letta_pool.session, mode=request.mode,
+                    use_cache=not request.no_cache,
+                )
+            except Exception as e:
+                logger.exception("Batch prediction failed for %s + %s: %s", name1, name2, e)
+                result = {"error": str(e)}
+        return name1, name2, result
+
+    async def events():
+        yield sse_event("batch", {"drugs": sorted(known), "missing": missing, "pairs": len(pairs),
+                                  "concurrency": BATCH_CONCURRENCY})
+
+        labels: Dict[Tuple[str, str], str] = {}
+        tasks = [asyncio.ensure_future(run_pair(a, b)) for a, b in pairs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                name1, name2, result = await next_done
+                label = result.get("final_verdict", {}).get("risk_label", "Unknown") if "error" not in result else "Unknown"
+                labels[(name1, name2)] = label
+                yield sse_event("pair", {"drug1": name1, "drug2": name2, "risk_label": label, "result": result})
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        drugs = sorted(known)
+        matrix = [
+            [None if a == b else labels.get(tuple(sorted((a, b))), "Unknown") for b in drugs]
+            for a in drugs
+        ]
+        worst_pair, worst_label = max(labels.items(), key=lambda item: risk_severity(item[1]))
+        yield sse_event("matrix", {
+            "drugs": drugs,
+            "matrix": matrix,
+            "worst": {"drug1": worst_pair[0], "drug2": worst_pair[1], "risk_label": worst_label},
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs", summary="Queue a Drug-Drug Interaction prediction", status_code=202)
+async def submit_job_endpoint(request: DDIJobRequest):
+    """
+    Returns a job id immediately; poll GET /jobs/{id} (optionally long-polling with `wait`)
+    or pass a `webhook_url` to be called with the finished job. Resubmitting a pair that is
+    already queued, running or recently done returns the existing job.
+    """
+    drugs, missing = drug_store.resolve(request.drug1_name, request.drug2_name)
+    if missing:
+        return JSONResponse({"error": f"Drugs not found in database: {', '.join(missing)}"}, status_code=404)
+
+    drug1, drug2 = drugs
+    precomputer.record_query(drug1.name, drug2.name)
+    try:
+        job, created = jobs.submit(drug1.name, drug2.name, request.mode, request.webhook_url)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse({**job, "created": created}, status_code=202 if created else 200,
+                        headers={"Location": f"/jobs/{job['id']}"})
+
+@app.get("/jobs/stats", summary="Job queue depth and status counts")
+async def job_stats_endpoint():
+    return jobs.stats()
+
+@app.get("/jobs/{job_id}", summary="Job status and result")
+async def get_job_endpoint(job_id: str, wait: float = 0):
+    """With `wait` (seconds, at most 60), holds the request until the job finishes or the wait runs out."""
+    job = await jobs.wait(job_id, min(max(wait, 0.0), 60.0))
+    if job is None:
+        return JSONResponse({"error": f"Unknown job: {job_id}"}, status_code=404)
+    return job
+
+@app.get("/similarity/{drug_name}", summary="Nearest structural analogs of a drug")
+async def similarity_endpoint(drug_name: str, k: int = 5):
+    """
+    Top-k nearest analogs by fingerprint Tanimoto similarity across the drug database.
+    """
+    drug = drug_store.get(drug_name)
+    if drug is None or drug.name not in ddi_system.similarity_index:
+        return JSONResponse({"error": f"Drug not found in database: {drug_name}"}, status_code=404)
+    return {
+        "drug": drug.name.lower(),
+        "analogs": [{"name": n, "tanimoto": score} for n, score in ddi_system.similarity_index.nearest(drug.name, k)],
+    }
+
+@app.get("/overlap/{drug_name}", summary="Drugs sharing targets or pathways with a drug")
+async def overlap_endpoint(drug_name: str, candidates: Optional[str] = None):
+    """
+    Drugs that share a target or pathway with `drug_name`, optionally restricted to a
+    comma-separated `candidates` list (e.g. a patient's medication list).
+    """
+    drug = drug_store.get(drug_name)
+    if drug is None or drug.name not in ddi_system.overlap_index:
+        return JSONResponse({"error": f"Drug not found in database: {drug_name}"}, status_code=404)
+    candidate_list = None
+    if candidates:
+        candidate_drugs, _ = drug_store.resolve(*(c for c in candidates.split(",") if c.strip()))
+        candidate_list = [d.name for d in candidate_drugs]
+    return {
+        "drug": drug.name.lower(),
+        "shared_targets": ddi_system.overlap_index.drugs_sharing_target(drug.name, candidate_list),
+        "shared_pathways": ddi_system.overlap_index.drugs_sharing_pathway(drug.name, candidate_list),
+    }
+
+@app.get("/drugs/{drug_name}", summary="Look up a drug by generic or brand name")
+async def drug_lookup_endpoint(drug_name: str):
+    drug = drug_store.get(drug_name)
+    if drug is None:
+        return JSONResponse({"error": f"Drug not found in database: {drug_name}"}, status_code=404)
+    return asdict(drug)
+
+@app.post("/drugs", summary="Add or update a drug")
+async def upsert_drug_endpoint(payload: DrugPayload, authorization: Optional[str] = Header(None)):
+    """
+    Stores the drug and refreshes the local indexes. If its targets, pathways or structure
+    changed, its cached pairs are dropped and queued for recomputation. Requires
+    DRUG_ADMIN_TOKEN; the endpoint does not exist without it.
+    """
+    if not DRUG_ADMIN_TOKEN:
+        return JSONResponse({"error": "Not Found"}, status_code=404)
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {DRUG_ADMIN_TOKEN}".encode()):
+        return JSONResponse({"error": "Invalid or missing admin token"}, status_code=401)
+    previous = drug_store.get(payload.name)
+    drug = DrugInfo(name=payload.name, smiles=payload.smiles, targets=payload.targets,
+                    pathways=payload.pathways, properties=payload.properties)
+    drug_store.add(drug, payload.brand_names)
+    changed = ddi_system.update_drug(drug, previous)
+    if changed:
+        precomputer.drug_changed(drug.name)
+    # The in-memory store starts from the built-in drugs on every restart.
+    return {"drug": drug.name.lower(), "created": previous is None, "changed": changed,
+            "persistent": isinstance(drug_store, SQLiteDrugStore)}
+
+@app.get("/precompute/status", summary="Background cache-warming progress and coverage")
+async def precompute_status_endpoint():
+    return {**precomputer.stats(), "enabled": PRECOMPUTE_ENABLED}
+
+@app.get("/known-interactions/stats", summary="Curated interaction knowledge base size")
+async def known_interactions_stats_endpoint():
+    return {**ddi_system.known_interactions.stats(), "enrich": ddi_system.enrich_known}
+
+@app.get("/pool/stats", summary="Letta connection pool utilization")
+async def pool_stats_endpoint():
+    return letta_pool.stats()
+
+@app.get("/metrics", summary="Prometheus metrics")
+async def metrics_endpoint():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/prompts/stats", summary="Prompt payload sizes before and after compaction")
+async def prompt_stats_endpoint():
+    return ddi_system.prompts.get_stats()
+
+@app.get("/scheduler/stats", summary="Agent request rate, concurrency and queue waits by priority")
+async def scheduler_stats_endpoint():
+    return ddi_system.scheduler.stats()
+
+@app.get("/resilience/stats", summary="Per-agent latency, timeouts and circuit breaker state")
+async def resilience_stats_endpoint():
+    return ddi_system.resilience.stats()
+
+@app.get("/cache/stats", summary="Prediction cache statistics")
+async def cache_stats_endpoint():
+    return {
+        **ddi_system.cache.get_stats(),
+        "in_flight": ddi_system.inflight.in_flight(),
+        "single_flight": ddi_system.inflight.stats,
+    }
+
+@app.delete("/cache", summary="Invalidate cached predictions")
+async def invalidate_cache_endpoint(drug1_name: Optional[str] = None, drug2_name: Optional[str] = None):
+    """
+    Clears the whole cache, every pair containing one drug, or a single pair.
+    """
+    removed = ddi_system.cache.invalidate(drug1_name, drug2_name)
+    return {"removed": removed}
 
 if __name__ == "__main__":
-    print("🚀 Starting Dr. Strange FastAPI Server...")
+    logger.info("🚀 Starting Dr. Strange FastAPI Server...")
     # Note: Use `reload=True` for development to auto-reload on code changes.
     uvicorn.run("engine:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""
+A persistent SQLite-backed job queue for DDI predictions that outlive an HTTP request.
+
+Jobs are idempotent per drug pair and mode: submitting a pair that is already queued,
+running or recently finished returns the existing job. A pool of asyncio workers runs
+them; jobs left queued or running by a previous process are picked up again at startup.
+A job that raises is retried with backoff up to max_attempts times, except for ValueError,
+which marks bad input and fails it at once. On completion, long-polling readers are woken
+and an optional webhook is called from its own task, so slow receivers never hold a worker.
+"""
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from prediction_cache import canonical_pair
+
+logger = logging.getLogger("dr_strange.jobs")
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+RETRY_BACKOFF_CAP = 60.0
+
+
+def _is_public_address(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_global
+    except ValueError:
+        return False
+
+
+def validate_webhook_url(url: str, allowed_hosts: Iterable[str] = ()) -> str:
+    """
+    Rejects webhook URLs the server should not be made to call: anything but http(s), and
+    hosts outside `allowed_hosts` when that is set. Without an allow-list, localhost and
+    non-public IP literals are refused; names are re-checked after resolution on delivery.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise ValueError("webhook_url must be an http(s) URL with a host")
+    allowed = [h.strip().lower() for h in allowed_hosts if h.strip()]
+    if allowed:
+        if not any(host == h or host.endswith("." + h) for h in allowed):
+            raise ValueError(f"webhook host {host} is not in JOB_WEBHOOK_ALLOWED_HOSTS")
+        return url
+    if host == "localhost" or host.endswith(".localhost"):
+        raise ValueError("webhook_url must not point at localhost")
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return url
+    if not address.is_global:
+        raise ValueError("webhook_url must not point at a private or reserved address")
+    return url
+
+
+class JobQueue:
+    def __init__(self, path: str, run_job: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 workers: int = 2, max_attempts: int = 3, result_ttl: float = 86400.0,
+                 webhook_attempts: int = 3, webhook_allowed_hosts: Iterable[str] = ()):
+        self.run_job = run_job
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.webhook_attempts = webhook_attempts
+        self.webhook_allowed_hosts = [h for h in webhook_allowed_hosts if h]
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                dedupe_key TEXT NOT NULL,
+                drug1 TEXT NOT NULL,
+                drug2 TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                webhook_url TEXT,
+                webhook_status TEXT,
+                result TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, created_at);
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+            """
+        )
+        self._db.commit()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Held only by the long-polls waiting on them, so polls that time out leave nothing behind.
+        self._done_events: "weakref.WeakValueDictionary[str, asyncio.Event]" = weakref.WeakValueDictionary()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._deliveries: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, run_job: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]) -> "JobQueue":
+        """
+        Reads JOB_QUEUE_PATH, JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_RESULT_TTL and
+        JOB_WEBHOOK_ALLOWED_HOSTS (comma-separated; subdomains match).
+        """
+        return cls(
+            os.getenv("JOB_QUEUE_PATH", "ddi_jobs.sqlite3"),
+            run_job,
+            workers=int(os.getenv("JOB_WORKERS", 2)),
+            max_attempts=max(1, int(os.getenv("JOB_MAX_ATTEMPTS", 3))),
+            result_ttl=float(os.getenv("JOB_RESULT_TTL", 86400)),
+            webhook_allowed_hosts=os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(","),
+        )
+
+    # --- Storage ---
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job.pop("dedupe_key")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def _update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    # --- Submission ---
+
+    def submit(self, drug1_name: str, drug2_name: str, mode: str = "full",
+               webhook_url: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Returns (job, created). A pair that already has a queued or running job, or one that
+        finished successfully within the result TTL, gets that job back instead of a new one.
+        Raises ValueError for a webhook URL that validate_webhook_url rejects.
+        """
+        if webhook_url:
+            validate_webhook_url(webhook_url, self.webhook_allowed_hosts)
+        drug_a, drug_b = canonical_pair(drug1_name, drug2_name)
+        dedupe_key = f"{drug_a}|{drug_b}|{mode}"
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE dedupe_key = ? AND (status IN ('queued', 'running') "
+                "OR (status = 'done' AND finished_at >= ?)) ORDER BY created_at DESC LIMIT 1",
+                (dedupe_key, time.time() - self.result_ttl),
+            ).fetchone()
+            if row is not None:
+                return self._row_to_job(row), False
+
+            job_id = uuid.uuid4().hex
+            self._db.execute(
+                "INSERT INTO jobs (id, dedupe_key, drug1, drug2, mode, status, created_at, webhook_url) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, dedupe_key, drug1_name, drug2_name, mode, time.time(), webhook_url),
+            )
+            self._db.commit()
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+        return self.get(job_id), True
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: returns the job once it is done or failed, or as it stands after `timeout`."""
+        job = self.get(job_id)
+        if job is None or job["status"] in ("done", "failed") or timeout <= 0:
+            return job
+        event = self._done_events.setdefault(job_id, asyncio.Event())
+        job = self.get(job_id)
+        if job is None or job["status"] in ("done", "failed"):
+            return job
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.get(job_id)
+
+    # --- Workers ---
+
+    async def start(self):
+        """Requeues work interrupted by the previous process and starts the worker pool."""
+        self._queue = asyncio.Queue()
+        with self._lock:
+            resumed = self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+            self._db.commit()
+            pending = [row["id"] for row in self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            )]
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+        if pending:
+            logger.info("📋 Resuming %d queued job(s) (%d were interrupted mid-run)", len(pending), resumed)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks + list(self._deliveries):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._deliveries, return_exceptions=True)
+        self._tasks = []
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception:
+                logger.exception("Job %s crashed the worker loop", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str):
+        job = self.get(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        if job["attempts"] >= self.max_attempts:
+            self._finish(job_id, "failed", error=f"Gave up after {job['attempts']} attempts")
+            return
+
+        self._update(job_id, status="running", started_at=time.time(), attempts=job["attempts"] + 1)
+        try:
+            result = await self.run_job(job)
+        except asyncio.CancelledError:
+            # Shutdown: leave it "running" so the next start() requeues it.
+            raise
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            if isinstance(e, ValueError) or attempts >= self.max_attempts:
+                logger.warning("Job %s (%s + %s) failed: %s", job_id, job["drug1"], job["drug2"], e)
+                self._finish(job_id, "failed", error=str(e))
+            else:
+                delay = min(RETRY_BACKOFF_CAP, 2.0 ** attempts)
+                logger.info("🔁 Job %s failed (attempt %d/%d), retrying in %.0fs: %s",
+                            job_id, attempts, self.max_attempts, delay, e)
+                self._update(job_id, status="queued", error=str(e))
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job_id)
+                return
+        else:
+            self._finish(job_id, "done", result=result)
+        self._deliver(job_id)
+
+    def _deliver(self, job_id: str):
+        """Calls the job's webhook, if any, in its own task."""
+        task = asyncio.ensure_future(self._notify(job_id))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None):
+        self._update(job_id, status=status, finished_at=time.time(),
+                     result=json.dumps(result) if result is not None else None, error=error)
+        event = self._done_events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _resolves_publicly(self, url: str) -> bool:
+        """Without an allow-list, a webhook host must resolve only to public addresses."""
+        if self.webhook_allowed_hosts:
+            return True
+        parts = urlsplit(url)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        except OSError:
+            return False
+        return bool(infos) and all(_is_public_address(info[4][0]) for info in infos)
+
+    async def _notify(self, job_id: str):
+        """POSTs the finished job to its webhook, retrying with backoff between attempts."""
+        job = self.get(job_id)
+        if job is None or not job["webhook_url"]:
+            return
+        if not await self._resolves_publicly(job["webhook_url"]):
+            self._update(job_id, webhook_status="refused: host resolves to a non-public address")
+            return
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        status = "failed"
+        for attempt in range(self.webhook_attempts):
+            if attempt:
+                await asyncio.sleep(2 ** (attempt - 1))
+            try:
+                # No redirects: they could send the POST somewhere validation never saw.
+                async with self._session.post(job["webhook_url"], json=job, allow_redirects=False) as response:
+                    if response.status < 300:
+                        status = "delivered"
+                        break
+                    status = f"http {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = f"error: {e}"
+        self._update(job_id, webhook_status=status)
+
+    # --- Status ---
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            **{status: counts.get(status, 0) for status in JOB_STATUSES},
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+        }
@@ -0,0 +1,162 @@
+"""
+Curated knowledge base of established drug-drug interactions.
+
+Entries are keyed by the normalized, unordered drug pair, so a lookup is a single dict
+access however many interactions are loaded. Names in the source file may be brand or
+generic: they are mapped to the drug store's generic name at load time, so lookups with
+the generic names the engine already resolved always match.
+"""
+import csv
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from prediction_cache import canonical_pair
+
+logger = logging.getLogger("dr_strange.known_interactions")
+
+# Verdict fields for each curated severity; the score sits inside the range that
+# get_risk_label maps to the same label.
+SEVERITY_VERDICTS = {
+    "very high": ("Very High", 0.9),
+    "high": ("High", 0.7),
+    "moderate": ("Moderate", 0.5),
+    "medium": ("Moderate", 0.5),
+    "low": ("Low", 0.25),
+    "minimal": ("Minimal", 0.05),
+    "none": ("None", 0.0),
+}
+
+# The interaction table the Next.js /api/predict route has always shipped.
+SEED_INTERACTIONS = [
+    {
+        "drug1": "warfarin", "drug2": "aspirin", "severity": "high",
+        "description": "Increased risk of bleeding when used together",
+        "mechanism": "Both drugs affect platelet aggregation and coagulation cascade",
+        "management": "Monitor INR closely, consider dose adjustment or alternative therapy",
+        "confidence": 0.92,
+    },
+    {
+        "drug1": "metformin", "drug2": "alcohol", "severity": "medium",
+        "description": "Risk of lactic acidosis and hypoglycemia",
+        "mechanism": "Alcohol enhances metformin effects and impairs glucose metabolism",
+        "management": "Advise patient to limit alcohol consumption",
+        "confidence": 0.78,
+    },
+    {
+        "drug1": "ibuprofen", "drug2": "lisinopril", "severity": "medium",
+        "description": "Reduced antihypertensive effect and potential kidney damage",
+        "mechanism": "NSAIDs can reduce ACE inhibitor efficacy and cause nephrotoxicity",
+        "management": "Monitor blood pressure and kidney function",
+        "confidence": 0.85,
+    },
+]
+
+
+@dataclass(frozen=True)
+class KnownInteraction:
+    drug1: str
+    drug2: str
+    severity: str
+    description: str
+    mechanism: str = ""
+    management: str = ""
+    confidence: Optional[float] = None
+    source: str = "curated"
+
+    def verdict(self) -> Dict[str, Any]:
+        """The interaction in the shape of a coordinator verdict, with its provenance."""
+        risk_label, risk_score = SEVERITY_VERDICTS.get(self.severity.lower(), ("Unknown", None))
+        return {
+            "risk_score": risk_score,
+            "risk_level": self.severity,
+            "risk_label": risk_label,
+            "explanation": self.description,
+            "key_mechanisms": [self.mechanism] if self.mechanism else [],
+            "recommendation": self.management,
+            "confidence": self.confidence,
+            "provenance": {"type": "known_interaction", "source": self.source},
+        }
+
+
+def _entry(raw: Dict[str, Any], source: str) -> KnownInteraction:
+    """Accepts flat entries and the route.ts shape ({"drugs": [a, b], "interaction": {...}})."""
+    if "drugs" in raw:
+        raw = {**raw.get("interaction", {}), "drug1": raw["drugs"][0], "drug2": raw["drugs"][1]}
+    confidence = raw.get("confidence")
+    return KnownInteraction(
+        drug1=raw["drug1"], drug2=raw["drug2"], severity=raw["severity"],
+        description=raw.get("description", ""), mechanism=raw.get("mechanism", ""),
+        management=raw.get("management", ""),
+        confidence=float(confidence) if confidence not in (None, "") else None,
+        source=raw.get("source") or source,
+    )
+
+
+def read_file(path: str) -> Iterator[KnownInteraction]:
+    """
+    Reads a CSV file (drug1, drug2, severity, description, mechanism, management,
+    confidence, source columns), a JSON list, or JSON lines (.jsonl).
+    """
+    source = os.path.basename(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield _entry(row, source)
+        elif path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield _entry(json.loads(line), source)
+        else:
+            for raw in json.load(f):
+                yield _entry(raw, source)
+
+
+class KnownInteractionIndex:
+    """Unordered drug pair -> curated interaction."""
+
+    def __init__(self, resolve_name: Optional[Callable[[str], str]] = None):
+        self.resolve_name = resolve_name or (lambda name: name)
+        self._entries: Dict[Tuple[str, str], KnownInteraction] = {}
+
+    @classmethod
+    def from_env(cls, resolve_name: Optional[Callable[[str], str]] = None) -> "KnownInteractionIndex":
+        """
+        Seeds the index with SEED_INTERACTIONS unless KNOWN_DDI_SEED=0, then loads
+        KNOWN_DDI_PATH if set; later entries for the same pair replace earlier ones.
+        """
+        index = cls(resolve_name)
+        if os.getenv("KNOWN_DDI_SEED", "1") == "1":
+            index.add_many(_entry(raw, "dr-strange seed table") for raw in SEED_INTERACTIONS)
+        path = os.getenv("KNOWN_DDI_PATH")
+        if path:
+            count = index.add_many(read_file(path))
+            logger.info("📚 Loaded %d known interactions from %s (%d pairs indexed)", count, path, len(index))
+        return index
+
+    def _pair(self, drug1_name: str, drug2_name: str) -> Tuple[str, str]:
+        return canonical_pair(self.resolve_name(drug1_name), self.resolve_name(drug2_name))
+
+    def add(self, interaction: KnownInteraction):
+        self._entries[self._pair(interaction.drug1, interaction.drug2)] = interaction
+
+    def add_many(self, interactions: Iterable[KnownInteraction]) -> int:
+        count = 0
+        for interaction in interactions:
+            self.add(interaction)
+            count += 1
+        return count
+
+    def lookup(self, drug1_name: str, drug2_name: str) -> Optional[KnownInteraction]:
+        return self._entries.get(self._pair(drug1_name, drug2_name))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        by_severity: Dict[str, int] = {}
+        for interaction in self._entries.values():
+            by_severity[interaction.severity] = by_severity.get(interaction.severity, 0) + 1
+        return {"interactions": len(self._entries), "by_severity": by_severity}
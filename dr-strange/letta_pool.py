@@ -0,0 +1,105 @@
+"""
+A shared, long-lived aiohttp connection pool for calls to the Letta API.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger("dr_strange.letta_pool")
+
+
+class LettaConnectionPool:
+    """
+    Owns the single aiohttp.ClientSession used for every Letta call. Connections are kept
+    alive between requests, DNS lookups are cached, and the number of sockets per host
+    is capped so bursts queue inside the connector rather than opening new TLS sessions.
+    """
+
+    def __init__(self, base_url: str, limit: int = 100, limit_per_host: int = 32,
+                 keepalive_timeout: float = 60, dns_ttl: int = 300):
+        self.base_url = base_url.rstrip("/")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.opened_at: Optional[float] = None
+        self.prewarmed = 0
+
+    @classmethod
+    def from_env(cls, base_url: str) -> "LettaConnectionPool":
+        """Creates a pool configured from LETTA_POOL_* environment variables."""
+        return cls(
+            base_url,
+            limit=int(os.getenv("LETTA_POOL_LIMIT", 100)),
+            limit_per_host=int(os.getenv("LETTA_POOL_LIMIT_PER_HOST", 32)),
+            keepalive_timeout=float(os.getenv("LETTA_POOL_KEEPALIVE", 60)),
+            dns_ttl=int(os.getenv("LETTA_POOL_DNS_TTL", 300)),
+        )
+
+    async def open(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_ttl,
+                use_dns_cache=True,
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+            self.opened_at = time.time()
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def prewarm(self, connections: int) -> int:
+        """
+        Opens `connections` keep-alive connections up front so the first real requests
+        skip DNS, TCP and TLS setup. Returns how many warm-up requests succeeded.
+        """
+        if connections <= 0:
+            return 0
+        session = await self.open()
+
+        async def touch() -> bool:
+            try:
+                async with session.head(f"{self.base_url}/v1/health/", timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    await response.read()
+                    return True
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                logger.warning("Connection pre-warm failed: %s", e)
+                return False
+
+        results = await asyncio.gather(*(touch() for _ in range(min(connections, self.limit_per_host))))
+        self.prewarmed = sum(results)
+        logger.info("🔥 Pre-warmed %d connection(s) to %s", self.prewarmed, self.base_url)
+        return self.prewarmed
+
+    def stats(self) -> Dict[str, Any]:
+        """Reports pool configuration and how many connections are in use or idle."""
+        in_use = idle = 0
+        connector = self.session.connector if self.session is not None and not self.session.closed else None
+        if connector is not None:
+            # aiohttp does not expose these counts publicly; read them defensively.
+            in_use = len(getattr(connector, "_acquired", ()))
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        return {
+            "open": connector is not None,
+            "base_url": self.base_url,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "dns_ttl": self.dns_ttl,
+            "in_use": in_use,
+            "idle": idle,
+            "utilization": in_use / self.limit if self.limit else 0.0,
+            "prewarmed": self.prewarmed,
+            "uptime_seconds": round(time.time() - self.opened_at, 1) if self.opened_at and connector else 0,
+        }
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Load generator for the DDI engine (/predict, /predict/batch) and the Dr. Ordinary
+backend (/analyze). Runs each scenario at a fixed concurrency, reports throughput and
+p50/p95/p99 latency, and writes the results as JSON. Passing --baseline prints the
+change against an earlier results file.
+
+Run both services against mock_letta.py to benchmark without spending Letta credits:
+
+    python loadtest.py --scenario predict --scenario analyze --concurrency 16 --requests 200 \\
+        --output results.json --baseline previous.json
+
+Pairs in the curated known-interaction table are answered without the pipeline and are
+left out, and --no-cache makes the engine skip its prediction cache so the numbers
+measure the agent pipeline rather than SQLite.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import subprocess
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+
+from known_interactions import SEED_INTERACTIONS, read_file
+from prediction_cache import canonical_pair
+
+DEFAULT_DRUGS = ["warfarin", "aspirin", "ibuprofen", "acetaminophen"]
+
+SAMPLE_PAGE = """Ibuprofen (Advil, Motrin) is a nonsteroidal anti-inflammatory drug.
+
+Patients taking warfarin should avoid combining it with aspirin or ibuprofen without
+talking to their doctor, because the combination increases bleeding risk.
+
+Acetaminophen 500 mg tablets are often recommended instead for mild pain."""
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))], 4)
+
+
+async def read_sse(response: aiohttp.ClientResponse) -> int:
+    """Drains a Server-Sent Events response and returns how many events it carried."""
+    events = 0
+    async for line in response.content:
+        if line.startswith(b"event:"):
+            events += 1
+    return events
+
+
+class Scenario:
+    """One endpoint under load: `make_request` sends a single request and returns its HTTP status."""
+
+    def __init__(self, name: str, make_request: Callable[[aiohttp.ClientSession, int], Awaitable[int]]):
+        self.name = name
+        self.make_request = make_request
+
+    async def run(self, session: aiohttp.ClientSession, concurrency: int, total: int,
+                  duration: Optional[float]) -> Dict[str, Any]:
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        counter = itertools.count()
+        deadline = time.perf_counter() + duration if duration else None
+
+        async def worker():
+            while True:
+                i = next(counter)
+                if deadline is None and i >= total:
+                    return
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                started = time.perf_counter()
+                try:
+                    status = str(await self.make_request(session, i))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        ok = sum(count for status, count in statuses.items() if status.startswith("2") or status == "304")
+        return {
+            "requests": len(latencies),
+            "ok": ok,
+            "errors": len(latencies) - ok,
+            "statuses": statuses,
+            "concurrency": concurrency,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else None,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "latency_max": round(max(latencies), 4) if latencies else None,
+        }
+
+
+def known_pairs(path: Optional[str]) -> Set[Tuple[str, str]]:
+    """Curated pairs: the built-in seed table plus the server's KNOWN_DDI_PATH file, if given."""
+    pairs = {canonical_pair(entry["drug1"], entry["drug2"]) for entry in SEED_INTERACTIONS}
+    if path:
+        pairs.update(canonical_pair(entry.drug1, entry.drug2) for entry in read_file(path))
+    return pairs
+
+
+def build_scenarios(args) -> Dict[str, Scenario]:
+    known = known_pairs(args.known_pairs)
+    pairs = [pair for pair in itertools.combinations(args.drugs, 2) if canonical_pair(*pair) not in known]
+    if not pairs:
+        raise SystemExit("Every drug pair is a curated known interaction; pass more --drugs")
+
+    async def predict(session, i):
+        drug1, drug2 = pairs[i % len(pairs)]
+        async with session.post(f"{args.engine_url}/predict",
+                                json={"drug1_name": drug1, "drug2_name": drug2, "mode": args.mode,
+                                      "no_cache": args.no_cache}) as response:
+            await response.read()
+            return response.status
+
+    async def batch(session, i):
+        drugs = random.sample(args.drugs, min(args.batch_size, len(args.drugs)))
+        async with session.post(f"{args.engine_url}/predict/batch",
+                                json={"drug_names": drugs, "mode": args.mode, "no_cache": args.no_cache}) as response:
+            await read_sse(response)
+            return response.status
+
+    async def analyze(session, i):
+        # A unique marker per request defeats the content-hash cache when --unique-pages is set.
+        content = SAMPLE_PAGE + (f"\n\nRequest {i}" if args.unique_pages else "")
+        async with session.post(f"{args.backend_url}/analyze",
+                                json={"url": f"https://example.com/page/{i % 50}", "content": content}) as response:
+            await response.read()
+            return response.status
+
+    return {"predict": Scenario("predict", predict), "batch": Scenario("batch", batch), "analyze": Scenario("analyze", analyze)}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """Prints the change in throughput and tail latency against a previous results file."""
+    print(f"\n📊 Against baseline {baseline.get('revision') or '?'} ({baseline.get('timestamp', '?')}):")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("throughput_rps", "latency_p50", "latency_p95", "latency_p99"):
+            before, after = previous.get(metric), current.get(metric)
+            if before and after is not None:
+                print(f"   {name:8} {metric:15} {before:>10} -> {after:<10} ({(after - before) / before:+.1%})")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the DDI engine and the Dr. Ordinary backend")
+    parser.add_argument("--scenario", action="append", choices=["predict", "batch", "analyze"],
+                        help="may be repeated; defaults to predict")
+    parser.add_argument("--engine-url", default="http://localhost:8000")
+    parser.add_argument("--backend-url", default="http://localhost:5000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--duration", type=float, help="run each scenario for this many seconds instead")
+    parser.add_argument("--mode", choices=["full", "batched", "fast"], default="full")
+    parser.add_argument("--drugs", nargs="+", default=DEFAULT_DRUGS)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--no-cache", action="store_true",
+                        help="have the engine skip its prediction cache for every predict/batch request")
+    parser.add_argument("--known-pairs", help="the server's KNOWN_DDI_PATH, to leave those pairs out too")
+    parser.add_argument("--unique-pages", action="store_true", help="make every /analyze body unique")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    args = parser.parse_args()
+
+    scenarios = build_scenarios(args)
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": git_revision(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "scenarios": {},
+    }
+
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency * 2)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        for name in args.scenario or ["predict"]:
+            print(f"🚦 Running {name} at concurrency {args.concurrency}...")
+            stats = await scenarios[name].run(session, args.concurrency, args.requests, args.duration)
+            results["scenarios"][name] = stats
+            print(f"   {stats['requests']} requests, {stats['errors']} errors, {stats['throughput_rps']} req/s, "
+                  f"p50 {stats['latency_p50']}s, p95 {stats['latency_p95']}s, p99 {stats['latency_p99']}s")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
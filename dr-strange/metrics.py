@@ -0,0 +1,90 @@
+"""
+Prometheus metrics and optional OpenTelemetry spans for the DDI pipeline.
+
+Spans are only recorded when DDI_TRACING=1 and the opentelemetry API is installed;
+otherwise `span` is a no-op.
+"""
+import os
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:
+    _otel_trace = None
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+AGENT_LATENCY = Histogram(
+    "ddi_agent_latency_seconds", "End-to-end run_agent latency, including retries and hedges",
+    ["agent"], buckets=LATENCY_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "ddi_stage_latency_seconds", "Latency of pipeline stages (run_agents, coordinator, summaries, ...)",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+NODE_LATENCY = Histogram(
+    "ddi_pipeline_node_latency_seconds", "Latency of each pipeline node, by whether an agent or local code produced it",
+    ["node", "source"], buckets=LATENCY_BUCKETS,
+)
+AGENT_ERRORS = Counter(
+    "ddi_agent_errors_total", "Failed agent attempts by kind (http, timeout, transport, circuit_open)",
+    ["agent", "kind"],
+)
+PARSE_FAILURES = Counter(
+    "ddi_agent_parse_failures_total", "Agent responses that could not be parsed, by reason",
+    ["agent", "reason"],
+)
+FALLBACKS = Counter(
+    "ddi_agent_fallbacks_total", "Agent results replaced by a local fallback", ["agent"],
+)
+PROMPT_BYTES = Histogram(
+    "ddi_agent_prompt_bytes", "Size of prompts sent to agents", ["agent"], buckets=BYTE_BUCKETS,
+)
+RESPONSE_BYTES = Histogram(
+    "ddi_agent_response_bytes", "Size of agent response bodies", ["agent"], buckets=BYTE_BUCKETS,
+)
+PROMPT_RAW_BYTES = Counter(
+    "ddi_prompt_payload_raw_bytes_total", "JSON payload bytes before prompt compaction", ["agent"],
+)
+PROMPT_COMPACT_BYTES = Counter(
+    "ddi_prompt_payload_compact_bytes_total", "JSON payload bytes actually sent after compaction", ["agent"],
+)
+QUEUE_WAIT = Histogram(
+    "ddi_agent_queue_wait_seconds", "Time an agent request waited in the scheduler before being sent",
+    ["agent", "priority"], buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+AGENTS_IN_FLIGHT = Gauge("ddi_agent_calls_in_flight", "Agent calls currently running", ["agent"])
+PIPELINES_IN_FLIGHT = Gauge("ddi_pipelines_in_flight", "DDI pipelines currently running")
+PIPELINES_CANCELLED = Counter(
+    "ddi_pipelines_cancelled_total", "Pipelines cut short, by reason (deadline, disconnect)", ["reason"],
+)
+
+_tracer = None
+if _otel_trace is not None and os.getenv("DDI_TRACING", "0") == "1":
+    _tracer = _otel_trace.get_tracer("dr_strange")
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[None]:
+    """An OpenTelemetry span when tracing is enabled, otherwise nothing."""
+    if _tracer is None:
+        yield
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes):
+        yield
+
+
+@contextmanager
+def stage(name: str, **attributes) -> Iterator[None]:
+    """Times a pipeline stage into STAGE_LATENCY and wraps it in a span."""
+    with span(name, **attributes), STAGE_LATENCY.labels(name).time():
+        yield
+
+
+def render() -> Tuple[bytes, str]:
+    """The current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Letta /v1/agents/{id}/messages API, for benchmarking without credits.
+
+Responses use the real message format (a "messages" list ending in an assistant_message)
+with canned per-agent content. Latency is drawn from a log-normal distribution and a
+configurable share of calls fail with a 500 or a 429.
+
+Point the services at it with LETTA_BASE_URL=http://localhost:8283. Agent IDs are mapped
+to agent types through the same LETTA_*_ID variables engine.py reads; unknown IDs are
+classified from the prompt.
+
+    python mock_letta.py --latency-median 1.5 --error-rate 0.02 --rate-limit-rate 0.05
+    python mock_letta.py --config mock_agents.json   # per-agent overrides
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict
+
+from aiohttp import web
+
+AGENT_ID_ENV = {
+    "LETTA_CHEMICAL_ANALYST_ID": "chemical_analyst",
+    "LETTA_PATHWAY_ANALYST_ID": "pathway_analyst",
+    "LETTA_TARGET_ANALYST_ID": "target_analyst",
+    "LETTA_SIMILARITY_ANALYST_ID": "similarity_analyst",
+    "LETTA_COORDINATOR_ID": "coordinator",
+    "LETTA_PRESENTER_ID": "presenter",
+    "LETTA_RISK_LABELER_ID": "risk_labeler",
+    "LETTA_AGENT_ID": "drug_extractor",
+}
+
+# Checked in order; the first pattern found in the prompt decides the agent type.
+PROMPT_PATTERNS = [
+    ("risk_labeler", re.compile(r"Classify the risk", re.I)),
+    ("coordinator", re.compile(r'"agent_analyses"')),
+    ("presenter", re.compile(r"summar", re.I)),
+    ("drug_extractor", re.compile(r"identify any drug names", re.I)),
+    ("chemical_analyst", re.compile(r"chemical properties", re.I)),
+    ("pathway_analyst", re.compile(r"pathway", re.I)),
+    ("target_analyst", re.compile(r"target", re.I)),
+    ("similarity_analyst", re.compile(r"similarity", re.I)),
+]
+
+# Section headers the engine's batched presenter prompt asks to be answered, e.g. "## risk_label".
+SECTION_REQUEST = re.compile(r"^##\s*([a-z_]+)\s*$", re.M)
+SECTION_REPLIES = {
+    "executive_summary": "Final risk score 0.62 (High): additive bleeding risk from combined antiplatelet and "
+                         "anticoagulant effects, driven by PTGS1 inhibition and protein binding displacement.",
+    "risk_label": "High",
+}
+
+KNOWN_DRUGS = ["warfarin", "aspirin", "ibuprofen", "acetaminophen", "metformin", "lisinopril",
+               "atorvastatin", "omeprazole", "advil", "tylenol", "coumadin"]
+
+
+def canned_content(agent_type: str, prompt: str) -> str:
+    """The assistant_message content a real agent of this type would send back."""
+    if agent_type == "chemical_analyst":
+        body = {"risk_score": 0.55, "interaction_hypothesis": "Both compounds are highly protein bound and may displace each other."}
+    elif agent_type == "pathway_analyst":
+        body = {"shared_pathways": ["arachidonic_acid_metabolism"], "risk_level": "moderate",
+                "explanation": "Overlapping prostaglandin pathway activity."}
+    elif agent_type == "target_analyst":
+        body = {"shared_targets": ["PTGS1"], "explanation": "Both drugs inhibit COX-1."}
+    elif agent_type == "similarity_analyst":
+        body = {"drug1_analogs": {"analogs": []}, "drug2_analogs": {"analogs": []},
+                "inferred_interaction": "No close structural analogs with known interactions.", "confidence_score": 0.4}
+    elif agent_type == "coordinator":
+        body = {"risk_score": 0.62, "reasoning": "Additive bleeding risk from combined antiplatelet and anticoagulant effects.",
+                "key_mechanisms": ["PTGS1 inhibition", "protein binding displacement"]}
+    elif agent_type == "presenter":
+        sections = SECTION_REQUEST.findall(prompt)
+        if sections:
+            # Batched presenter call: answer every requested section under its header.
+            return "\n\n".join(
+                f"## {name}\n" + SECTION_REPLIES.get(
+                    name, f"The {name.replace('_', ' ')} points to a moderate interaction risk.")
+                for name in sections
+            )
+        return "The combination carries a moderate interaction risk driven by shared COX-1 inhibition."
+    elif agent_type == "risk_labeler":
+        return "High"
+    elif agent_type == "drug_extractor":
+        found = [name for name in KNOWN_DRUGS if re.search(rf"\b{name}\b", prompt, re.I)]
+        return json.dumps(found)
+    else:
+        return "Working"
+    return "```json\n" + json.dumps(body, indent=2) + "\n```"
+
+
+def letta_response(content: str, prompt: str) -> Dict[str, Any]:
+    """Wraps assistant content in the /messages response envelope."""
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    return {
+        "messages": [
+            {"id": f"message-{uuid.uuid4()}", "date": now, "message_type": "reasoning_message",
+             "reasoning": "Analyzing the request."},
+            {"id": f"message-{uuid.uuid4()}", "date": now, "message_type": "assistant_message",
+             "content": content},
+        ],
+        "usage": {
+            "message_type": "usage_statistics",
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+            "step_count": 1,
+        },
+    }
+
+
+class MockLetta:
+    def __init__(self, defaults: Dict[str, float], overrides: Dict[str, Dict[str, float]], retry_after: float = 1.0):
+        self.defaults = defaults
+        self.overrides = overrides
+        self.retry_after = retry_after
+        self.agent_types = {os.getenv(env): agent_type for env, agent_type in AGENT_ID_ENV.items() if os.getenv(env)}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def settings(self, agent_type: str) -> Dict[str, float]:
+        return {**self.defaults, **self.overrides.get(agent_type, {})}
+
+    def classify(self, agent_id: str, prompt: str) -> str:
+        if agent_id in self.agent_types:
+            return self.agent_types[agent_id]
+        for agent_type, pattern in PROMPT_PATTERNS:
+            if pattern.search(prompt):
+                return agent_type
+        return "unknown"
+
+    def count(self, agent_type: str, outcome: str):
+        bucket = self.counters.setdefault(agent_type, {})
+        bucket[outcome] = bucket.get(outcome, 0) + 1
+
+    async def messages(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []) if isinstance(m, dict))
+        agent_type = self.classify(request.match_info["agent_id"], prompt)
+        settings = self.settings(agent_type)
+
+        roll = random.random()
+        if roll < settings["rate_limit_rate"]:
+            self.count(agent_type, "429")
+            return web.json_response({"detail": "Rate limit exceeded"}, status=429,
+                                     headers={"Retry-After": str(self.retry_after)})
+
+        delay = random.lognormvariate(math.log(settings["latency_median"]), settings["latency_sigma"])
+        await asyncio.sleep(min(delay, settings["latency_max"]))
+
+        if roll < settings["rate_limit_rate"] + settings["error_rate"]:
+            self.count(agent_type, "500")
+            return web.json_response({"detail": "Internal server error"}, status=500)
+
+        self.count(agent_type, "200")
+        return web.json_response(letta_response(canned_content(agent_type, prompt), prompt))
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.counters)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/agents/{agent_id}/messages", self.messages)
+        app.router.add_route("*", "/v1/health/", self.health)
+        app.router.add_get("/mock/stats", self.stats)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Letta agent API for load testing")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8283)
+    parser.add_argument("--latency-median", type=float, default=1.0, help="median response time in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal shape; larger means a longer tail")
+    parser.add_argument("--latency-max", type=float, default=120.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--config", help="JSON file of per-agent-type overrides, e.g. {\"coordinator\": {\"latency_median\": 4}}")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    overrides = {}
+    if args.config:
+        with open(args.config) as f:
+            overrides = json.load(f)
+
+    mock = MockLetta(
+        defaults={
+            "latency_median": args.latency_median,
+            "latency_sigma": args.latency_sigma,
+            "latency_max": args.latency_max,
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+        },
+        overrides=overrides,
+        retry_after=args.retry_after,
+    )
+    print(f"🧪 Mock Letta listening on http://{args.host}:{args.port}")
+    web.run_app(mock.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Inverted target and pathway indexes for computing drug overlaps locally.
+"""
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set
+
+
+def _norm_target(target: str) -> str:
+    return target.strip().upper()
+
+
+def _norm_pathway(pathway: str) -> str:
+    return pathway.strip().lower()
+
+
+class OverlapIndex:
+    """
+    Maps each target and pathway to the drugs that hit it (target -> drugs, pathway -> drugs),
+    alongside each drug's own sets. Pairwise overlap is a set intersection, and "which drugs
+    share a target with X" only walks the posting lists of X's targets rather than the database.
+    """
+
+    def __init__(self):
+        self.drug_targets: Dict[str, FrozenSet[str]] = {}
+        self.drug_pathways: Dict[str, FrozenSet[str]] = {}
+        self.target_to_drugs: Dict[str, Set[str]] = defaultdict(set)
+        self.pathway_to_drugs: Dict[str, Set[str]] = defaultdict(set)
+
+    @classmethod
+    def from_drugs(cls, drugs: Iterable[Any]) -> "OverlapIndex":
+        """Builds the index from objects with `name`, `targets` and `pathways` (e.g. DrugInfo)."""
+        index = cls()
+        for drug in drugs:
+            index.add(drug.name, drug.targets, drug.pathways)
+        return index
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self.drug_targets
+
+    def add(self, name: str, targets: Iterable[str], pathways: Iterable[str]):
+        """Adds a drug, replacing any previous entry for it."""
+        key = name.lower()
+        self.remove(key)
+        self.drug_targets[key] = frozenset(_norm_target(t) for t in targets)
+        self.drug_pathways[key] = frozenset(_norm_pathway(p) for p in pathways)
+        for target in self.drug_targets[key]:
+            self.target_to_drugs[target].add(key)
+        for pathway in self.drug_pathways[key]:
+            self.pathway_to_drugs[pathway].add(key)
+
+    def remove(self, name: str):
+        key = name.lower()
+        for target in self.drug_targets.pop(key, ()):
+            self.target_to_drugs[target].discard(key)
+            if not self.target_to_drugs[target]:
+                del self.target_to_drugs[target]
+        for pathway in self.drug_pathways.pop(key, ()):
+            self.pathway_to_drugs[pathway].discard(key)
+            if not self.pathway_to_drugs[pathway]:
+                del self.pathway_to_drugs[pathway]
+
+    def overlap(self, name1: str, name2: str) -> Dict[str, List[str]]:
+        """Shared and drug-specific targets and pathways for a pair."""
+        t1 = self.drug_targets.get(name1.lower(), frozenset())
+        t2 = self.drug_targets.get(name2.lower(), frozenset())
+        p1 = self.drug_pathways.get(name1.lower(), frozenset())
+        p2 = self.drug_pathways.get(name2.lower(), frozenset())
+        return {
+            "shared_targets": sorted(t1 & t2),
+            "drug1_only_targets": sorted(t1 - t2),
+            "drug2_only_targets": sorted(t2 - t1),
+            "shared_pathways": sorted(p1 & p2),
+            "drug1_only_pathways": sorted(p1 - p2),
+            "drug2_only_pathways": sorted(p2 - p1),
+        }
+
+    def _sharing(self, own: FrozenSet[str], postings: Dict[str, Set[str]], name: str,
+                 candidates: Optional[Iterable[str]]) -> Dict[str, List[str]]:
+        allowed = {c.lower() for c in candidates} if candidates is not None else None
+        shared: Dict[str, List[str]] = defaultdict(list)
+        for item in sorted(own):
+            for other in postings.get(item, ()):
+                if other != name and (allowed is None or other in allowed):
+                    shared[other].append(item)
+        return dict(shared)
+
+    def drugs_sharing_target(self, name: str, candidates: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+        """Drugs (optionally restricted to `candidates`) sharing at least one target with `name`, with the shared targets."""
+        key = name.lower()
+        return self._sharing(self.drug_targets.get(key, frozenset()), self.target_to_drugs, key, candidates)
+
+    def drugs_sharing_pathway(self, name: str, candidates: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+        """Drugs (optionally restricted to `candidates`) sharing at least one pathway with `name`, with the shared pathways."""
+        key = name.lower()
+        return self._sharing(self.drug_pathways.get(key, frozenset()), self.pathway_to_drugs, key, candidates)
@@ -0,0 +1,124 @@
+"""
+A small dependency-graph scheduler for the agent pipeline.
+
+Each node declares the nodes whose results it needs; it is started the moment all of
+them have finished, so independent branches overlap instead of running in serial phases.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class PipelineNode:
+    """
+    A unit of work. `func` receives a dict mapping each declared input to its result.
+    `source` records what produces the result ("agent" for a Letta call, "local" otherwise).
+    """
+    name: str
+    func: Callable[[Dict[str, Any]], Awaitable[Any]]
+    inputs: List[str] = field(default_factory=list)
+    source: str = "agent"
+
+
+@dataclass
+class NodeResult:
+    name: str
+    result: Any
+    started: float
+    finished: float
+    source: str = "agent"
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+    def timing(self) -> Dict[str, float]:
+        return {
+            "start": round(self.started, 3),
+            "end": round(self.finished, 3),
+            "duration": round(self.duration, 3),
+        }
+
+
+def _validate(nodes: List[PipelineNode]):
+    names = [node.name for node in nodes]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate pipeline node names: {names}")
+    known = set(names)
+    for node in nodes:
+        unknown = [i for i in node.inputs if i not in known]
+        if unknown:
+            raise ValueError(f"Node '{node.name}' depends on unknown node(s): {', '.join(unknown)}")
+
+    # Kahn's algorithm: every node must be reachable from the roots or there is a cycle.
+    remaining = {node.name: set(node.inputs) for node in nodes}
+    ready = [name for name, deps in remaining.items() if not deps]
+    while ready:
+        done = ready.pop()
+        del remaining[done]
+        for name, deps in remaining.items():
+            if done in deps:
+                deps.discard(done)
+                if not deps:
+                    ready.append(name)
+    if remaining:
+        raise ValueError(f"Pipeline has a dependency cycle through: {', '.join(sorted(remaining))}")
+
+
+async def iter_pipeline(nodes: List[PipelineNode], deadline: Optional[float] = None) -> AsyncIterator[NodeResult]:
+    """
+    Runs the graph and yields each node's result as soon as it completes.
+    Times are seconds relative to the start of the run. If a node raises, or the
+    consumer stops iterating early, every outstanding node is cancelled. The same
+    happens when `deadline` (a time.monotonic() value) passes: iteration then ends
+    without the unfinished nodes.
+    """
+    _validate(nodes)
+    results: Dict[str, Any] = {}
+    started: Dict[str, float] = {}
+    running: Dict[asyncio.Task, PipelineNode] = {}
+    pending = list(nodes)
+    t0 = time.perf_counter()
+
+    def launch_ready():
+        for node in list(pending):
+            if all(i in results for i in node.inputs):
+                pending.remove(node)
+                deps = {i: results[i] for i in node.inputs}
+                started[node.name] = time.perf_counter() - t0
+                running[asyncio.ensure_future(node.func(deps))] = node
+
+    try:
+        launch_ready()
+        while running:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            done, _ = await asyncio.wait(running.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                return
+            finished_now = []
+            for task in done:
+                node = running.pop(task)
+                results[node.name] = task.result()
+                finished_now.append(NodeResult(
+                    node.name, results[node.name], started[node.name], time.perf_counter() - t0, node.source
+                ))
+            launch_ready()
+            for node_result in finished_now:
+                yield node_result
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running.keys(), return_exceptions=True)
+
+
+async def run_pipeline(nodes: List[PipelineNode]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, float]]]:
+    """Runs the graph to completion and returns (results by node name, timings by node name)."""
+    results: Dict[str, Any] = {}
+    timings: Dict[str, Dict[str, float]] = {}
+    async for node_result in iter_pipeline(nodes):
+        results[node_result.name] = node_result.result
+        timings[node_result.name] = node_result.timing()
+    return results, timings
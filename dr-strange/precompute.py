@@ -0,0 +1,262 @@
+"""
+Background warming of the prediction cache over drug pairs.
+
+Pairs are visited in priority order: pairs of a drug that was just added or changed,
+then an explicit pair list, then pairs by observed popularity, and finally every
+remaining pair. Predictions run one at a time at a fixed pace and stop while
+interactive traffic is high, so warming never competes with real users for Letta.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import aiohttp
+
+from agent_scheduler import set_call_class
+from drug_store import DrugStore
+from prediction_cache import canonical_pair
+
+logger = logging.getLogger("dr_strange.precompute")
+
+Pair = Tuple[str, str]
+
+# The popularity log is rewritten as aggregated "drug1,drug2,count" lines at most this
+# often, keeping only the most popular pairs, so it stays bounded and off the request path.
+POPULARITY_FLUSH_INTERVAL = 60.0
+MAX_POPULAR_PAIRS = 10000
+# Pairs answered without Letta (cached, known, unknown) between yields to the event loop,
+# so a pass over an already-warm formulary does not stall requests.
+YIELD_EVERY_PAIRS = 100
+
+
+def load_pairs(path: str) -> List[Tuple[Pair, int]]:
+    """
+    Reads "drug1,drug2[,count]" lines. Repeated pairs accumulate, so an append-only query
+    log and a hand-written priority list use the same format. Order of first appearance is kept.
+    """
+    counts: Dict[Pair, int] = {}
+    with open(path) as f:
+        for line in f:
+            parts = [p.strip() for p in line.split(",")]
+            if len(parts) < 2 or not parts[0] or not parts[1] or parts[0].startswith("#"):
+                continue
+            pair = canonical_pair(parts[0], parts[1])
+            count = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 1
+            counts[pair] = counts.get(pair, 0) + count
+    return list(counts.items())
+
+
+class Precomputer:
+    def __init__(self, system: Any, store: DrugStore, session_factory: Callable[[], Optional[aiohttp.ClientSession]],
+                 mode: str = "full", rate_per_minute: float = 2.0, pause_in_flight: int = 2,
+                 pairs_path: Optional[str] = None, popularity_log: Optional[str] = None,
+                 rescan_interval: float = 3600.0):
+        self.system = system
+        self.store = store
+        self.session_factory = session_factory
+        self.mode = mode
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.pause_in_flight = pause_in_flight
+        self.popularity_log = popularity_log
+        self.rescan_interval = rescan_interval
+
+        self.priority_pairs = [pair for pair, _ in load_pairs(pairs_path)] if pairs_path and os.path.exists(pairs_path) else []
+        self.popularity = Counter(dict(load_pairs(popularity_log))) if popularity_log and os.path.exists(popularity_log) else Counter()
+        self.changed: deque = deque()
+        self.covered: Set[Pair] = set()
+        self.state = "stopped"
+        self.current: Optional[Pair] = None
+        self.passes = 0
+        self.counters = Counter()
+        self._popularity_dirty = False
+        self._flushed_at = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    @classmethod
+    def from_env(cls, system: Any, store: DrugStore,
+                 session_factory: Callable[[], Optional[aiohttp.ClientSession]]) -> "Precomputer":
+        return cls(
+            system, store, session_factory,
+            mode=os.getenv("PRECOMPUTE_MODE", "full"),
+            rate_per_minute=float(os.getenv("PRECOMPUTE_RATE", 2)),
+            # Interactive agent requests running or queued in the scheduler.
+            pause_in_flight=int(os.getenv("PRECOMPUTE_PAUSE_IN_FLIGHT", 2)),
+            pairs_path=os.getenv("PRECOMPUTE_PAIRS_PATH"),
+            popularity_log=os.getenv("PRECOMPUTE_POPULARITY_LOG"),
+            rescan_interval=float(os.getenv("PRECOMPUTE_RESCAN_INTERVAL", 3600)),
+        )
+
+    # --- Inputs ---
+
+    def record_query(self, drug1_name: str, drug2_name: str):
+        """Counts an interactive query towards the pair's popularity; the log is flushed in the background."""
+        self.popularity[canonical_pair(drug1_name, drug2_name)] += 1
+        self._popularity_dirty = True
+        if len(self.popularity) > 2 * MAX_POPULAR_PAIRS:
+            self.popularity = Counter(dict(self.popularity.most_common(MAX_POPULAR_PAIRS)))
+        if self.popularity_log and time.monotonic() - self._flushed_at >= POPULARITY_FLUSH_INTERVAL:
+            self._flushed_at = time.monotonic()
+            self._popularity_dirty = False
+            snapshot = self.popularity.most_common(MAX_POPULAR_PAIRS)
+            asyncio.get_running_loop().run_in_executor(None, self._write_popularity, snapshot)
+
+    def _write_popularity(self, pairs: List[Tuple[Pair, int]]):
+        """Atomically replaces the popularity log with aggregated counts."""
+        tmp = f"{self.popularity_log}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                for (drug_a, drug_b), count in pairs:
+                    f.write(f"{drug_a},{drug_b},{count}\n")
+            os.replace(tmp, self.popularity_log)
+        except OSError as e:
+            logger.warning("Could not write popularity log %s: %s", self.popularity_log, e)
+
+    def drug_changed(self, drug_name: str):
+        """Queues every pair of a new or edited drug ahead of everything else."""
+        name = drug_name.strip().lower()
+        self.covered = {pair for pair in self.covered if name not in pair}
+        queued = set(self.changed)
+        for other in self.store.iter_drugs():
+            pair = canonical_pair(name, other.name)
+            if pair[0] != pair[1] and pair not in queued:
+                self.changed.append(pair)
+        self._wake.set()
+
+    # --- Scheduling ---
+
+    def _pass_order(self) -> Iterator[Pair]:
+        """One pass over all pairs: explicit list, then by popularity, then the rest."""
+        seen: Set[Pair] = set()
+        for pair in itertools.chain(self.priority_pairs, (p for p, _ in self.popularity.most_common())):
+            if pair not in seen:
+                seen.add(pair)
+                yield pair
+        names = sorted(drug.name.lower() for drug in self.store.iter_drugs())
+        for pair in itertools.combinations(names, 2):
+            if pair not in seen:
+                yield pair
+
+    def _next_pair(self, order: Iterator[Pair]) -> Optional[Pair]:
+        if self.changed:
+            return self.changed.popleft()
+        return next(order, None)
+
+    async def _wait_for_quiet(self):
+        """
+        Blocks while interactive agent requests (running or queued in the scheduler) are at
+        or above the pause threshold. Batch, job and precompute traffic does not count.
+        """
+        paused_at = None
+        while self.system.scheduler.active("interactive") >= self.pause_in_flight:
+            if paused_at is None:
+                paused_at = time.monotonic()
+                self.state = "paused"
+            await asyncio.sleep(1.0)
+        if paused_at is not None:
+            self.counters["paused_seconds"] += round(time.monotonic() - paused_at)
+        self.state = "running"
+
+    async def _warm(self, pair: Pair) -> bool:
+        """Computes and caches one pair unless it is already cached. Returns True if Letta was called."""
+        drugs, missing = self.store.resolve(*pair)
+        if missing:
+            self.counters["unknown"] += 1
+            return False
+        drug1, drug2 = drugs
+        if self.system.cache.contains(self.system.cache_key(drug1, drug2, self.mode)):
+            self.covered.add(pair)
+            self.counters["already_cached"] += 1
+            return False
+        if self.system.known_interactions.lookup(drug1.name, drug2.name) is not None:
+            # Answered from the knowledge base without Letta; enrichment happens on demand.
+            self.covered.add(pair)
+            self.counters["known"] += 1
+            return False
+
+        self.current = pair
+        try:
+            result = await self.system.cached_predict_ddi(drug1, drug2, session=self.session_factory(), mode=self.mode)
+        except Exception as e:
+            logger.warning("Precompute failed for %s + %s: %s", pair[0], pair[1], e)
+            self.counters["failed"] += 1
+            return True
+        finally:
+            self.current = None
+
+        if self.system.is_cacheable(result):
+            self.covered.add(pair)
+            self.counters["computed"] += 1
+        else:
+            self.counters["failed"] += 1
+        return True
+
+    async def run(self):
+        """Runs passes forever, sleeping between them until the rescan interval or a drug change."""
+        set_call_class("background", "precompute")
+        while True:
+            order = self._pass_order()
+            skipped = 0
+            while (pair := self._next_pair(order)) is not None:
+                await self._wait_for_quiet()
+                if await self._warm(pair):
+                    if self.interval:
+                        await asyncio.sleep(self.interval)
+                else:
+                    skipped += 1
+                    if skipped % YIELD_EVERY_PAIRS == 0:
+                        await asyncio.sleep(0)
+            self.passes += 1
+            self.state = "idle"
+            logger.info("✅ Precompute pass %d finished: %d/%d pairs cached", self.passes, len(self.covered),
+                        self.total_pairs())
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.rescan_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self.state = "running"
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.state = "stopped"
+        if self.popularity_log and self._popularity_dirty:
+            self._popularity_dirty = False
+            await asyncio.to_thread(self._write_popularity, self.popularity.most_common(MAX_POPULAR_PAIRS))
+
+    # --- Status ---
+
+    def total_pairs(self) -> int:
+        n = len(self.store)
+        return n * (n - 1) // 2
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.total_pairs()
+        return {
+            "state": self.state,
+            "mode": self.mode,
+            "current": list(self.current) if self.current else None,
+            "passes": self.passes,
+            "covered_pairs": len(self.covered),
+            "total_pairs": total,
+            "coverage": round(len(self.covered) / total, 4) if total else 1.0,
+            "changed_queue": len(self.changed),
+            "priority_pairs": len(self.priority_pairs),
+            "popular_pairs": len(self.popularity),
+            "rate_per_minute": 60.0 / self.interval if self.interval else None,
+            "pause_in_flight": self.pause_in_flight,
+            **self.counters,
+        }
@@ -0,0 +1,183 @@
+"""
+Two-tier cache for DDI predictions: an in-memory LRU in front of a SQLite store.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Bump this whenever the agent prompts change in a way that invalidates old verdicts.
+PROMPT_VERSION = "4"
+
+
+def canonical_pair(drug1_name: str, drug2_name: str) -> Tuple[str, str]:
+    """Returns the two drug names normalized and in a fixed order."""
+    a, b = drug1_name.strip().lower(), drug2_name.strip().lower()
+    return (a, b) if a <= b else (b, a)
+
+
+def make_cache_key(drug1_name: str, drug2_name: str, agent_ids: Dict[str, str],
+                   prompt_version: str = PROMPT_VERSION) -> str:
+    """Builds an order-independent key covering the pair, the agents and the prompt version."""
+    material = {
+        "pair": canonical_pair(drug1_name, drug2_name),
+        "agents": sorted(agent_ids.items()),
+        "prompt_version": prompt_version,
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """An LRU of recent predictions backed by an on-disk SQLite table so entries survive restarts."""
+
+    def __init__(self, path: Optional[str] = "prediction_cache.sqlite3", max_entries: int = 256,
+                 ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[float, Tuple[str, str], Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                      "expired": 0, "evictions": 0, "stores": 0}
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS predictions (
+                       key TEXT PRIMARY KEY,
+                       drug_a TEXT NOT NULL,
+                       drug_b TEXT NOT NULL,
+                       created_at REAL NOT NULL,
+                       result TEXT NOT NULL
+                   )"""
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS predictions_drug_a ON predictions (drug_a)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS predictions_drug_b ON predictions (drug_b)")
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "PredictionCache":
+        """Creates a cache configured from PREDICTION_CACHE_* environment variables."""
+        path = os.getenv("PREDICTION_CACHE_PATH", "prediction_cache.sqlite3")
+        ttl = float(os.getenv("PREDICTION_CACHE_TTL", 7 * 24 * 3600))
+        return cls(
+            path=path if path.lower() not in ("", "none", "off") else None,
+            max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", 256)),
+            ttl_seconds=ttl if ttl > 0 else None,
+        )
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, pair: Tuple[str, str], result: Dict[str, Any]):
+        self._memory[key] = (created_at, pair, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached prediction for a key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, _, result = entry
+                if not self._is_expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return result
+                del self._memory[key]
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT created_at, drug_a, drug_b, result FROM predictions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    created_at, drug_a, drug_b, payload = row
+                    if not self._is_expired(created_at):
+                        result = json.loads(payload)
+                        self._remember(key, created_at, (drug_a, drug_b), result)
+                        self.stats["hits"] += 1
+                        self.stats["disk_hits"] += 1
+                        return result
+                    self._db.execute("DELETE FROM predictions WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.stats["expired"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def contains(self, key: str) -> bool:
+        """Whether a fresh entry exists, without touching the hit/miss stats or LRU order."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._is_expired(entry[0]):
+                return True
+            if self._db is None:
+                return False
+            row = self._db.execute("SELECT created_at FROM predictions WHERE key = ?", (key,)).fetchone()
+            return row is not None and not self._is_expired(row[0])
+
+    def set(self, key: str, drug1_name: str, drug2_name: str, result: Dict[str, Any]):
+        """Stores a prediction in both tiers."""
+        drug_a, drug_b = canonical_pair(drug1_name, drug2_name)
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, (drug_a, drug_b), result)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, drug_a, drug_b, created_at, result) VALUES (?, ?, ?, ?, ?)",
+                    (key, drug_a, drug_b, created_at, json.dumps(result)),
+                )
+                self._db.commit()
+            self.stats["stores"] += 1
+
+    def invalidate(self, drug1_name: Optional[str] = None, drug2_name: Optional[str] = None) -> int:
+        """
+        Drops cached predictions. With no arguments everything is cleared; with one drug
+        every pair containing it is dropped; with two drugs only that pair is dropped.
+        Returns the number of entries removed.
+        """
+        if drug1_name and drug2_name:
+            pair = canonical_pair(drug1_name, drug2_name)
+            matches = lambda p: p == pair
+            where, params = "drug_a = ? AND drug_b = ?", pair
+        elif drug1_name or drug2_name:
+            name = (drug1_name or drug2_name).strip().lower()
+            matches = lambda p: name in p
+            where, params = "drug_a = ? OR drug_b = ?", (name, name)
+        else:
+            matches = lambda p: True
+            where, params = "1 = 1", ()
+
+        with self._lock:
+            doomed = [key for key, (_, entry_pair, _) in self._memory.items() if matches(entry_pair)]
+            for key in doomed:
+                del self._memory[key]
+            if self._db is None:
+                return len(doomed)
+            removed = self._db.execute(f"DELETE FROM predictions WHERE {where}", params).rowcount
+            self._db.commit()
+            return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters along with current tier sizes."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            return {
+                **self.stats,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
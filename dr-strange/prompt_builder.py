@@ -0,0 +1,225 @@
+"""
+Compact, budgeted JSON payloads for the coordinator, presenter and risk-labeler prompts.
+
+Payloads are serialized without whitespace, stripped of nulls, error blobs and repeated
+values, projected down to the fields the receiving agent actually uses, and then cut to
+a token budget by dropping the lowest-value fields first.
+"""
+import copy
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from metrics import PROMPT_COMPACT_BYTES, PROMPT_RAW_BYTES
+
+logger = logging.getLogger("dr_strange.prompts")
+
+# Bookkeeping keys the engine adds to results; no agent needs to see them.
+STRIP_KEYS = frozenset({"error", "fallback_reason", "circuit_open"})
+
+# Agents often restate one field under an alias; the alias is dropped only when its value
+# is identical to the field it restates. Distinct facts that happen to match are kept.
+REDUNDANT_KEYS = {
+    "summary": ("explanation", "reasoning"),
+    "reasoning": ("explanation",),
+    "final_risk_score": ("risk_score",),
+    "overall_risk_score": ("risk_score",),
+    "mechanisms": ("key_mechanisms", "mechanism"),
+    "recommendations": ("recommendation",),
+}
+
+# The coordinator reasons over targets, pathways and properties; the structure itself was
+# already analyzed by the chemical and similarity analysts.
+DRUG_FIELDS = ("name", "targets", "pathways", "properties")
+
+# What the presenter's one-sentence summaries draw on, per analyst.
+ANALYSIS_FIELDS = {
+    "chemical_analyst": ("risk_score", "interaction_hypothesis", "mechanism", "explanation", "summary"),
+    "pathway_analyst": ("shared_pathways", "risk_level", "risk_score", "explanation", "summary"),
+    "target_analyst": ("shared_targets", "risk_score", "explanation", "summary"),
+    "similarity_analyst": ("inferred_interaction", "confidence_score", "tanimoto_similarity",
+                           "drug1_analogs", "drug2_analogs"),
+}
+
+# What the presenter and risk labeler need from the coordinator's verdict.
+VERDICT_FIELDS = ("risk_score", "final_risk_score", "overall_risk_score", "risk_level", "reasoning",
+                  "explanation", "key_mechanisms", "mechanisms", "recommendation", "recommendations")
+
+# Fields removed first, in order, when a payload is over budget.
+COORDINATOR_DROP_ORDER = (
+    ("drug1", "properties"), ("drug2", "properties"),
+    ("agent_analyses", "similarity_analyst", "drug1_analogs"),
+    ("agent_analyses", "similarity_analyst", "drug2_analogs"),
+    ("drug1", "pathways"), ("drug2", "pathways"),
+    ("drug1", "targets"), ("drug2", "targets"),
+)
+ANALYSIS_DROP_ORDER = (("summary",), ("drug1_analogs",), ("drug2_analogs",), ("explanation",))
+VERDICT_DROP_ORDER = (("recommendations",), ("recommendation",), ("mechanisms",), ("explanation",), ("key_mechanisms",))
+
+# Strings longer than this may be shortened as a last resort.
+MIN_TRUNCATE_CHARS = 80
+
+
+def compact(value: Any) -> str:
+    """JSON without indentation or separator whitespace."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English and JSON)."""
+    return (len(text) + 3) // 4
+
+
+def prune(value: Any) -> Any:
+    """
+    Drops None and empty-string values, bookkeeping keys, aliases in REDUNDANT_KEYS that
+    repeat the field they restate, and duplicate list items.
+    """
+    if isinstance(value, dict):
+        pruned = {}
+        for key, item in value.items():
+            if key in STRIP_KEYS:
+                continue
+            item = prune(item)
+            if item is None or item == "":
+                continue
+            pruned[key] = item
+        for alias, originals in REDUNDANT_KEYS.items():
+            if alias in pruned and any(pruned.get(o) == pruned[alias] for o in originals if o != alias):
+                del pruned[alias]
+        return pruned
+    if isinstance(value, list):
+        pruned = []
+        for item in value:
+            item = prune(item)
+            if item is not None and item not in pruned:
+                pruned.append(item)
+        return pruned
+    return value
+
+
+def project(value: Dict[str, Any], fields: Sequence[str]) -> Dict[str, Any]:
+    """Keeps only `fields`, in that order; agents that answer in another shape are passed through whole."""
+    projected = {key: value[key] for key in fields if key in value}
+    return projected or value
+
+
+def _delete(value: Dict[str, Any], path: Tuple[str, ...]) -> bool:
+    for key in path[:-1]:
+        value = value.get(key) if isinstance(value, dict) else None
+    if isinstance(value, dict) and path[-1] in value:
+        del value[path[-1]]
+        return True
+    return False
+
+
+def _truncate_longest_string(value: Any) -> bool:
+    """Halves the longest string in the payload. Returns False once nothing is long enough."""
+    longest: Optional[Tuple[Any, Any]] = None
+    longest_len = MIN_TRUNCATE_CHARS
+    stack = [value]
+    while stack:
+        node = stack.pop()
+        items = node.items() if isinstance(node, dict) else enumerate(node) if isinstance(node, list) else ()
+        for key, item in items:
+            if isinstance(item, str) and len(item) > longest_len:
+                longest, longest_len = (node, key), len(item)
+            elif isinstance(item, (dict, list)):
+                stack.append(item)
+    if longest is None:
+        return False
+    node, key = longest
+    node[key] = node[key][:longest_len // 2].rstrip() + "…"
+    return True
+
+
+def fit_budget(value: Dict[str, Any], budget: int,
+               drop_order: Sequence[Tuple[str, ...]]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Drops fields in `drop_order` until the compact payload fits in `budget` tokens, then
+    shortens the longest strings. Returns the fitted copy and what was dropped.
+    """
+    if not budget or estimate_tokens(compact(value)) <= budget:
+        return value, []
+    value = copy.deepcopy(value)
+    dropped = []
+    for path in drop_order:
+        if _delete(value, path):
+            dropped.append(".".join(path))
+            if estimate_tokens(compact(value)) <= budget:
+                return value, dropped
+    truncated = False
+    while estimate_tokens(compact(value)) > budget and _truncate_longest_string(value):
+        truncated = True
+    return value, (dropped + ["truncated strings"] if truncated else dropped)
+
+
+class PromptBuilder:
+    """Builds the JSON payloads embedded in agent prompts and tracks how much they shrink."""
+
+    def __init__(self, token_budget: int = 0):
+        self.token_budget = token_budget
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"prompts": 0, "raw_bytes": 0, "compact_bytes": 0, "over_budget": 0}
+        )
+
+    def _render(self, agent: str, raw: Any, payload: Dict[str, Any],
+                drop_order: Sequence[Tuple[str, ...]]) -> str:
+        payload, dropped = fit_budget(payload, self.token_budget, drop_order)
+        text = compact(payload)
+        raw_bytes = len(json.dumps(raw, indent=2, default=str).encode("utf-8"))
+        compact_bytes = len(text.encode("utf-8"))
+
+        stats = self.stats[agent]
+        stats["prompts"] += 1
+        stats["raw_bytes"] += raw_bytes
+        stats["compact_bytes"] += compact_bytes
+        stats["over_budget"] += bool(dropped)
+        PROMPT_RAW_BYTES.labels(agent).inc(raw_bytes)
+        PROMPT_COMPACT_BYTES.labels(agent).inc(compact_bytes)
+        logger.debug("%s payload %d -> %d bytes%s", agent, raw_bytes, compact_bytes,
+                     f" (dropped {', '.join(dropped)})" if dropped else "")
+        return text
+
+    def coordinator_input(self, drug1: Dict[str, Any], drug2: Dict[str, Any],
+                          analyses: Dict[str, Any]) -> str:
+        """Both drugs and every successful analysis; failed analysts are listed by name only."""
+        raw = {"drug1": drug1, "drug2": drug2, "agent_analyses": analyses}
+        payload = {
+            "drug1": project(prune(drug1), DRUG_FIELDS),
+            "drug2": project(prune(drug2), DRUG_FIELDS),
+            "agent_analyses": {
+                agent_type: prune(analysis) for agent_type, analysis in analyses.items()
+                if not (isinstance(analysis, dict) and "error" in analysis)
+            },
+        }
+        unavailable = [agent_type for agent_type, analysis in analyses.items()
+                       if isinstance(analysis, dict) and "error" in analysis]
+        if unavailable:
+            payload["unavailable_analyses"] = unavailable
+        return self._render("coordinator", raw, payload, COORDINATOR_DROP_ORDER)
+
+    def analysis(self, agent_type: str, analysis: Dict[str, Any]) -> str:
+        """One specialist analysis, as the presenter needs it for a summary sentence."""
+        payload = project(prune(analysis), ANALYSIS_FIELDS.get(agent_type, ()))
+        return self._render("presenter", analysis, payload, ANALYSIS_DROP_ORDER)
+
+    def analyses(self, analyses: Dict[str, Dict[str, Any]]) -> str:
+        """Several specialist analyses in one payload, for the batched presenter call."""
+        payload = {agent_type: project(prune(analysis), ANALYSIS_FIELDS.get(agent_type, ()))
+                   for agent_type, analysis in analyses.items()}
+        drop_order = [(agent_type,) + path for path in ANALYSIS_DROP_ORDER for agent_type in analyses]
+        return self._render("presenter_batch", analyses, payload, drop_order)
+
+    def verdict(self, agent: str, coordinator_response: Dict[str, Any]) -> str:
+        """The coordinator's verdict, for the presenter's executive summary or the risk labeler."""
+        payload = project(prune(coordinator_response), VERDICT_FIELDS)
+        return self._render(agent, coordinator_response, payload, VERDICT_DROP_ORDER)
+
+    def get_stats(self) -> Dict[str, Any]:
+        per_agent = {}
+        for agent, stats in self.stats.items():
+            saved = 1 - stats["compact_bytes"] / stats["raw_bytes"] if stats["raw_bytes"] else 0.0
+            per_agent[agent] = {**stats, "saved": round(saved, 3)}
+        return {"token_budget": self.token_budget, "agents": per_agent}
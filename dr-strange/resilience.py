@@ -0,0 +1,254 @@
+"""
+Latency-aware timeouts, hedging, retry backoff and circuit breaking for agent calls, and
+the per-request deadline that bounds all of them.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class AgentCallError(Exception):
+    """A failed agent attempt. `retryable` marks 429s, 5xx responses and transport errors."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header; HTTP-date values are ignored."""
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+# --- Deadlines ---
+
+# Absolute time.monotonic() deadline of the request the current task is working for.
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(seconds: Optional[float]):
+    """Bounds agent calls made from the current task (and tasks it starts); None or 0 removes the bound."""
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current deadline (negative once it has passed), or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def hedged_call(send: Callable[[], Awaitable[Any]], delay: Optional[float],
+                      admitted: Optional[asyncio.Event] = None) -> Tuple[Any, bool]:
+    """
+    Awaits `send()`, and if it has not finished after `delay` seconds starts one duplicate
+    and takes whichever succeeds first. Returns (result, hedge_won). The loser is cancelled;
+    if both fail, the last error is raised. When `admitted` is given, the delay only starts
+    once it is set, so time spent waiting for admission never triggers a hedge.
+    """
+    primary = asyncio.ensure_future(send())
+    tasks = {primary}
+    try:
+        if delay is None:
+            return await primary, False
+        if admitted is not None:
+            admission = asyncio.ensure_future(admitted.wait())
+            try:
+                await asyncio.wait({primary, admission}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                admission.cancel()
+            if primary.done():
+                return primary.result(), False
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            tasks.add(asyncio.ensure_future(send()))
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is not primary
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class LatencyTracker:
+    """Keeps a sliding window of successful call latencies per agent type."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, agent_type: str, seconds: float):
+        self._samples[agent_type].append(seconds)
+
+    def percentile(self, agent_type: str, pct: float) -> Optional[float]:
+        """The pct-th percentile latency, or None until enough samples have been seen."""
+        samples = self._samples[agent_type]
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            agent_type: {
+                "samples": len(samples),
+                "p50": self.percentile(agent_type, 50),
+                "p95": self.percentile(agent_type, 95),
+                "p99": self.percentile(agent_type, 99),
+            }
+            for agent_type, samples in self._samples.items()
+        }
+
+
+class BreakerTicket(NamedTuple):
+    """Admission from CircuitBreaker.allow(); only the ticket's holder reports its outcome."""
+    generation: int
+    trial: bool
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets one trial call through (half-open). A successful
+    trial closes the circuit; a failed one opens it again, and one that ends without
+    an outcome (cancelled, say) hands the trial back with release_trial().
+
+    allow() returns a ticket naming the circuit generation it was admitted in. Outcomes of
+    calls admitted before the circuit last opened are ignored, so a slow call from the
+    closed state cannot close, reopen or free the trial of a half-open circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._generation = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> Optional[BreakerTicket]:
+        if self.state == "closed":
+            return BreakerTicket(self._generation, trial=False)
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return BreakerTicket(self._generation, trial=True)
+        return None
+
+    def _current(self, ticket: BreakerTicket) -> bool:
+        return ticket.generation == self._generation and (ticket.trial or self.state == "closed")
+
+    def record_success(self, ticket: BreakerTicket):
+        if not self._current(ticket):
+            return
+        self.failures = 0
+        self.state = "closed"
+        self._trial_in_flight = False
+
+    def record_failure(self, ticket: BreakerTicket):
+        if not self._current(ticket):
+            return
+        self.failures += 1
+        self._trial_in_flight = False
+        if ticket.trial or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._generation += 1
+
+    def release_trial(self, ticket: BreakerTicket):
+        """Lets another call be the half-open trial; a no-op once the trial's outcome was recorded."""
+        if ticket.trial and self._current(ticket):
+            self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class ResiliencePolicy:
+    """
+    Per-agent timeouts derived from observed latency, hedge delays, retry backoff and
+    circuit breakers. Until an agent has enough latency samples, the flat default
+    timeout applies and hedging is disabled. A hedge is only sent past the agent's p95,
+    so it duplicates roughly one call in twenty.
+    """
+
+    def __init__(self, default_timeout: float = 90.0, min_timeout: float = 10.0,
+                 timeout_multiplier: float = 2.0, hedge_percentile: Optional[float] = 95.0,
+                 max_attempts: int = 3, backoff_base: float = 0.5, backoff_cap: float = 8.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.hedge_percentile = hedge_percentile
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.latency = LatencyTracker()
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.counters = defaultdict(int)
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        """Reads the LETTA_TIMEOUT, LETTA_MAX_ATTEMPTS, LETTA_HEDGE_PERCENTILE and breaker settings."""
+        hedge_percentile = float(os.getenv("LETTA_HEDGE_PERCENTILE", 95))
+        return cls(
+            default_timeout=float(os.getenv("LETTA_TIMEOUT", 90)),
+            min_timeout=float(os.getenv("LETTA_MIN_TIMEOUT", 10)),
+            hedge_percentile=hedge_percentile or None,
+            max_attempts=max(1, int(os.getenv("LETTA_MAX_ATTEMPTS", 3))),
+            failure_threshold=int(os.getenv("LETTA_BREAKER_THRESHOLD", 5)),
+            reset_timeout=float(os.getenv("LETTA_BREAKER_RESET", 30)),
+        )
+
+    def breaker(self, agent_type: str) -> CircuitBreaker:
+        if agent_type not in self.breakers:
+            self.breakers[agent_type] = CircuitBreaker(self._failure_threshold, self._reset_timeout)
+        return self.breakers[agent_type]
+
+    def timeout_for(self, agent_type: str) -> float:
+        """p99 latency times a safety multiplier, clamped between min_timeout and the default."""
+        p99 = self.latency.percentile(agent_type, 99)
+        if p99 is None:
+            return self.default_timeout
+        return max(self.min_timeout, min(self.default_timeout, p99 * self.timeout_multiplier))
+
+    def hedge_delay(self, agent_type: str) -> Optional[float]:
+        """How long to wait on the primary before sending a duplicate request, if hedging applies."""
+        if not self.hedge_percentile:
+            return None
+        return self.latency.percentile(agent_type, self.hedge_percentile)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than a server-provided Retry-After."""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency.stats(),
+            "timeouts": {agent_type: self.timeout_for(agent_type) for agent_type in self.latency.stats()},
+            "breakers": {agent_type: b.snapshot() for agent_type, b in self.breakers.items()},
+            "counters": dict(self.counters),
+        }
@@ -0,0 +1,61 @@
+"""
+Coalesces concurrent identical async calls so only one of them does the work.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Deduplicates in-flight work by key. The first caller for a key starts the computation
+    as a standalone task; every concurrent caller for that key awaits the same task.
+
+    Callers await the task through asyncio.shield, so a caller being cancelled (for example
+    a client disconnecting) only abandons its own wait. The shared work is cancelled once
+    every caller has abandoned it, so nobody pays for a result nobody is waiting for.
+    Exceptions raised by the work are re-raised to every waiter.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.stats = {"leaders": 0, "followers": 0, "errors": 0, "abandoned": 0}
+
+    def _on_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._waiters.pop(task, None)
+        # Retrieve the exception so it is not reported as unhandled when every waiter has gone away.
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+
+    async def do(self, key: str, work: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Runs `work()` for `key` unless an identical call is already in flight.
+        Returns the result and whether this caller shared another caller's computation.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["followers"] += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            if not task.done():
+                self._waiters[task] -= 1
+                if self._waiters[task] == 0:
+                    # Forget it now so a caller arriving before the cancellation lands starts afresh.
+                    self.stats["abandoned"] += 1
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+                    task.cancel()
+
+    def in_flight(self) -> int:
+        """Returns the number of distinct computations currently running."""
+        return len(self._inflight)
@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from prompt_builder import compact, estimate_tokens, fit_budget  # noqa: E402
+
+
+def test_payload_within_budget_is_returned_unchanged():
+    payload = {"risk_score": 0.4, "explanation": "Both drugs prolong the QT interval."}
+    fitted, dropped = fit_budget(payload, 1000, [("explanation",)])
+    assert fitted == payload
+    assert dropped == []
+
+
+def test_dropping_a_field_is_not_reported_as_truncation():
+    payload = {"risk_score": 0.4, "details": "x" * 400}
+    fitted, dropped = fit_budget(payload, 20, [("details",)])
+    assert "details" not in fitted
+    assert dropped == ["details"]
+
+
+def test_over_budget_without_long_strings_adds_no_marker():
+    payload = {f"k{i}": i for i in range(40)}
+    fitted, dropped = fit_budget(payload, 5, [])
+    assert fitted == payload
+    assert dropped == []
+
+
+def test_shortened_strings_are_reported():
+    payload = {"explanation": "word " * 200}
+    fitted, dropped = fit_budget(payload, 50, [])
+    assert dropped == ["truncated strings"]
+    assert estimate_tokens(compact(fitted)) <= 50
@@ -0,0 +1,44 @@
+from resilience import CircuitBreaker
+
+
+def open_breaker():
+    """A breaker with one call admitted while closed and then opened by another call."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    stale = breaker.allow()
+    failing = breaker.allow()
+    breaker.record_failure(failing)
+    assert breaker.state == "open"
+    return breaker, stale
+
+
+def test_only_the_trial_holder_releases_the_trial():
+    breaker, stale = open_breaker()
+    trial = breaker.allow()
+    assert trial is not None and trial.trial
+    # The call admitted while closed finishes and runs its cleanup.
+    breaker.release_trial(stale)
+    assert breaker.allow() is None
+    breaker.release_trial(trial)
+    assert breaker.allow() is not None
+
+
+def test_stale_outcomes_do_not_move_a_half_open_breaker():
+    breaker, stale = open_breaker()
+    trial = breaker.allow()
+    breaker.record_success(stale)
+    assert breaker.state == "half_open"
+    breaker.record_failure(stale)
+    assert breaker.state == "half_open"
+    breaker.record_success(trial)
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_and_ignores_its_late_release():
+    breaker, _ = open_breaker()
+    breaker.reset_timeout = 60.0
+    breaker.state, breaker.opened_at = "open", 0.0
+    trial = breaker.allow()
+    breaker.record_failure(trial)
+    breaker.release_trial(trial)
+    assert breaker.state == "open"
+    assert breaker.allow() is None
@@ -0,0 +1,32 @@
+import pytest
+
+from similarity import SimilarityIndex
+
+# Kekulé and aromatic spellings, written from different starting atoms.
+SPELLINGS = {
+    "aspirin": ("CC(=O)OC1=CC=CC=C1C(=O)O", "OC(=O)c1ccccc1OC(C)=O"),
+    "ibuprofen": ("CC(C)CC1=CC=C(C=C1)C(C)C(=O)O", "OC(=O)C(C)c1ccc(CC(C)C)cc1"),
+    "caffeine": ("CN1C=NC2=C1C(=O)N(C(=O)N2C)C", "Cn1cnc2c1c(=O)n(C)c(=O)n2C"),
+    "warfarin": ("CC(=O)CC(C1=CC=CC=C1)C1=C(O)C2=CC=CC=C2OC1=O", "CC(=O)CC(c1ccccc1)c1c(O)c2ccccc2oc1=O"),
+    "indole": ("C1=CC=C2C(=C1)C=CN2", "c1ccc2[nH]ccc2c1"),
+    "biphenyl": ("C1=CC=C(C=C1)C1=CC=CC=C1", "c1ccc(cc1)-c1ccccc1"),
+}
+
+
+@pytest.mark.parametrize("name", sorted(SPELLINGS))
+def test_spellings_of_one_molecule_score_one(name):
+    first, second = SPELLINGS[name]
+    index = SimilarityIndex(["a", "b"], [first, second])
+    assert index.tanimoto("a", "b") == pytest.approx(1.0)
+
+
+def test_different_molecules_are_not_similar():
+    index = SimilarityIndex(["aspirin", "ibuprofen"], [SPELLINGS["aspirin"][0], SPELLINGS["ibuprofen"][1]])
+    assert index.tanimoto("aspirin", "ibuprofen") < 0.4
+
+
+def test_analyze_pair_calls_respellings_very_similar():
+    index = SimilarityIndex(["a", "b"], list(SPELLINGS["aspirin"]))
+    result = index.analyze_pair("a", "b")
+    assert result["tanimoto_similarity"] == pytest.approx(1.0)
+    assert "very similar" in result["inferred_interaction"]